@@ -5,9 +5,12 @@
 import json
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from functools import lru_cache
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
+import click
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
@@ -15,7 +18,17 @@ from forms import *
 from config import *
 from flask_migrate import Migrate
 from copy import copy
-from sqlalchemy import func, distinct
+from sqlalchemy import func, distinct, event, DDL, select, tuple_, cast, \
+    type_coerce
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+from math import ceil
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from fsnd_common.query_stats import QueryStats, queries_while_streaming
+from page_cache import PageCache
+from fsnd_common.db_pool import add_health_route
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -23,16 +36,61 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config.DefaultConfig')
 db = SQLAlchemy(app)
+query_stats = QueryStats(app)
+# Rendered pages, cleared by every handler writing to the database
+page_cache = PageCache(app)
+add_health_route(app, db)
 
 migrate = Migrate(app, db)
 
+# Number of results shown per page of venue and artist searches
+SEARCH_RESULTS_PER_PAGE = 20
+# Number of shows per page of the show listing
+SHOWS_PER_PAGE = 30
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 
+class GenreList(TypeDecorator):
+    # List of genre names. Stored as an ARRAY on PostgreSQL, where a GIN
+    # index serves the genre filters, and as a comma joined string elsewhere
+    impl = db.String(120)
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.ARRAY(db.String))
+        return dialect.type_descriptor(db.String(120))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == 'postgresql':
+            return value
+        return ','.join(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == 'postgresql':
+            return value
+        return value.split(',') if value else []
+
+
+def has_genre(model, genre):
+    if db.engine.dialect.name == 'postgresql':
+        return model.genres.op('@>')(
+            cast(postgresql.array([genre]), postgresql.ARRAY(db.String)))
+    genres = ',' + type_coerce(model.genres, db.String) + ','
+    return func.instr(genres, ',' + genre + ',') > 0
+
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    # Trigram index, so that name ILIKE '%term%' does not scan the table
+    __table_args__ = (db.Index('ix_Venue_name_trgm', 'name',
+                               postgresql_using='gin',
+                               postgresql_ops={'name': 'gin_trgm_ops'}),
+                      db.Index('ix_Venue_genres', 'genres',
+                               postgresql_using='gin'))
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -40,13 +98,16 @@ class Venue(db.Model):
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.Column(GenreList, nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     # Self TODO: see if description state should be dependent on the bool value
     seeking_description = db.Column(db.String(240))
+    # Maintained by the upcoming show counters, see below
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0,
+                                   server_default='0')
     show_ref = db.relationship('Show', backref='venue',
                                lazy=True)
 
@@ -72,18 +133,27 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    # Trigram index, so that name ILIKE '%term%' does not scan the table
+    __table_args__ = (db.Index('ix_Artist_name_trgm', 'name',
+                               postgresql_using='gin',
+                               postgresql_ops={'name': 'gin_trgm_ops'}),
+                      db.Index('ix_Artist_genres', 'genres',
+                               postgresql_using='gin'))
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.Column(GenreList, nullable=False)
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(240))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
+    # Maintained by the upcoming show counters, see below
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0,
+                                   server_default='0')
     show_ref = db.relationship('Show', backref='artist',
                                lazy=True)
 
@@ -108,6 +178,15 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    # Every page filters shows on their venue or artist and start time. The
+    # trailing column lets the detail pages join without visiting the table.
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time',
+                 'venue_id', 'start_time', 'artist_id'),
+        db.Index('ix_Show_artist_id_start_time',
+                 'artist_id', 'start_time', 'venue_id'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False,
@@ -120,20 +199,186 @@ class Show(db.Model):
     def __init__(self, artist, venue, time=None):
         self.venue_id = venue.id
         self.artist_id = artist.id
+        if isinstance(time, str):
+            time = dateutil.parser.parse(time)
+            # Stored as naive UTC, like every other timestamp
+            if time.tzinfo is not None:
+                time = time.astimezone(timezone.utc).replace(tzinfo=None)
         self.start_time = time or datetime.now()
 
+
+class ShowCountState(db.Model):
+    __tablename__ = 'ShowCountState'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # The num_upcoming_shows counters include every show starting at or
+    # after counted_at
+    counted_at = db.Column(db.DateTime, nullable=False)
+
+
+# The trigram indexes need the extension when the tables are created
+# without the migrations, e.g. by db.create_all()
+event.listen(db.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+             .execute_if(dialect='postgresql'))
+
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#----------------------------------------------------------------------------#
+
+# Venue.num_upcoming_shows and Artist.num_upcoming_shows are kept up to date
+# incrementally, so that listings and searches read them instead of joining
+# and aggregating the whole Show table:
+# - creating or deleting a show shifts the counters of its venue and artist,
+# - shows which started since counted_at are subtracted before reading the
+#   counters, see refresh_upcoming_show_counts.
+# `flask recount-shows` recomputes all of them from scratch.
+
+
+def get_counted_at(connection, for_update=False):
+    # Writers which shift the counters lock the state, so that
+    # refresh_upcoming_show_counts cannot move counted_at between their
+    # reading it and their commit, and count their shows twice or never.
+    query = select([ShowCountState.counted_at])
+    if for_update:
+        query = query.with_for_update()
+    return connection.execute(query).scalar()
+
+
+def shift_upcoming_show_counts(connection, shows, delta):
+    # shows are (venue_id, artist_id) pairs
+    shows = list(shows)
+    for model, counts in ((Venue, Counter(show[0] for show in shows)),
+                          (Artist, Counter(show[1] for show in shows))):
+        for id, count in counts.items():
+            connection.execute(
+                model.__table__.update()
+                .where(model.id == id)
+                .values(num_upcoming_shows=model.num_upcoming_shows +
+                        delta * count))
+
+
+def recount_upcoming_shows(connection, now):
+    for model, column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        upcoming = select([func.count(Show.id)])\
+            .where(column == model.id)\
+            .where(Show.start_time >= now).as_scalar()
+        connection.execute(model.__table__.update()
+                           .values(num_upcoming_shows=upcoming))
+    connection.execute(ShowCountState.__table__.delete())
+    connection.execute(ShowCountState.__table__.insert()
+                       .values(id=1, counted_at=now))
+
+
+def shows_started_between(start, end):
+    return select([Show.venue_id, Show.artist_id])\
+        .where(Show.start_time >= start)\
+        .where(Show.start_time < end)
+
+
+def refresh_upcoming_show_counts():
+    connection = db.session.connection()
+    now = datetime.utcnow()
+    counted_at = get_counted_at(connection)
+    if counted_at is None:
+        recount_upcoming_shows(connection, now)
+        db.session.commit()
+        return
+
+    # Usually no show started since the last request, which costs a single
+    # indexed lookup on Show.start_time
+    started = shows_started_between(counted_at, now).limit(1)
+    if connection.execute(started).first() is None:
+        return
+
+    # Lock the state, so that concurrent requests subtract those shows once
+    counted_at = get_counted_at(connection, for_update=True)
+    if counted_at < now:
+        shift_upcoming_show_counts(connection, connection.execute(
+            shows_started_between(counted_at, now)), -1)
+        connection.execute(ShowCountState.__table__.update()
+                           .values(counted_at=now))
+    db.session.commit()
+
+
+def forget_upcoming_shows(criterion):
+    # To be called before shows are deleted in bulk, e.g. by the cascade of
+    # a venue or artist deletion, which the mapper events do not see.
+    connection = db.session.connection()
+    counted_at = get_counted_at(connection, for_update=True)
+    if counted_at is not None:
+        shift_upcoming_show_counts(connection, connection.execute(
+            select([Show.venue_id, Show.artist_id])
+            .where(criterion)
+            .where(Show.start_time >= counted_at)), -1)
+
+
+@event.listens_for(Show, 'after_insert')
+def count_inserted_show(mapper, connection, show):
+    counted_at = get_counted_at(connection, for_update=True)
+    if counted_at is not None and show.start_time >= counted_at:
+        shift_upcoming_show_counts(
+            connection, [(show.venue_id, show.artist_id)], 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def count_deleted_show(mapper, connection, show):
+    counted_at = get_counted_at(connection, for_update=True)
+    if counted_at is not None and show.start_time >= counted_at:
+        shift_upcoming_show_counts(
+            connection, [(show.venue_id, show.artist_id)], -1)
+
+
+@app.cli.command('recount-shows')
+def recount_shows_command():
+    """Recompute the upcoming show counters of all venues and artists."""
+    recount_upcoming_shows(db.session.connection(), datetime.utcnow())
+    db.session.commit()
+    page_cache.clear()
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Number of rows inserted per statement.')
+def import_command(kind, path, chunk_size):
+    """Import venues, artists or shows from a CSV or JSON lines file."""
+    # importer imports this module
+    from importer import import_file
+    import_file(kind, path, chunk_size)
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def get_datetime_pattern(format, locale):
+    # Compiled once per locale and format, instead of on every call
+    return (babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)),
+            babel.Locale.parse(locale))
+
+
+@lru_cache(maxsize=4096)
+def format_datetime_cached(value, format, locale):
+    # Pages list the same few timestamps over and over
+    pattern, babel_locale = get_datetime_pattern(format, locale)
+    return pattern.apply(value, babel_locale)
+
+
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+    # Takes datetimes as they come from the database, strings are parsed
+    # for backwards compatibility
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return format_datetime_cached(value, format, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -151,109 +396,175 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@page_cache.cached()
 def venues():
 
     # num_shows should be aggregated based on number of upcoming shows per
-    # venue
+    # venue. All venues are fetched in one round trip and bucketed per
+    # location in python, instead of re-running the query for every location.
+    refresh_upcoming_show_counts()
     venue_data = db.session.query(Venue.city,
                                   Venue.state,
                                   Venue.id,
                                   Venue.name,
-                                  func.count(Show.id).filter(
-                                      Show.start_time >= datetime.utcnow())
-                                  .label("num_upcoming_shows"))\
-        .outerjoin(Show).group_by(Venue)
-
-    def get_venues_for_location(city, state):
-        venues_list = []
-        aggregated_shows = 0
-        for venue in venue_data.filter(Venue.city == city, Venue.state == state).all():
-            venues_list.append(venue)
-            # To order the location in the main view
-            aggregated_shows += venue.num_upcoming_shows
-        return venues_list, aggregated_shows
+                                  Venue.num_upcoming_shows)
+    genre = request.args.get('genre')
+    if genre:
+        venue_data = venue_data.filter(has_genre(Venue, genre))
 
-    data = []
-    unique_locations = db.session.query(
-        Venue.city, Venue.state).distinct(Venue.city, Venue.state)
-    for entry in unique_locations.all():
-        location = entry._asdict()
-        data.append(location)
-        data[-1]['venues'], data[-1]['aggregated_shows'] = get_venues_for_location(
-            location["city"], location["state"])
-
-    data.sort(key=lambda x: x['aggregated_shows'], reverse=True)
+    data = group_venues_by_location(venue_data.all())
 
     return render_template('pages/venues.html', areas=data)
 
 
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-
-    user_query = request.form.get('search_term', '')
-    pattern = '%{0}%'.format(user_query)
-
-    db_query = db.session.query(Venue.id,
-                                Venue.name, func.count(Show.id)
-                                .filter(Show.start_time >= datetime.utcnow())
-                                .label("num_upcoming_shows")
+def group_venues_by_location(venues_list):
+    areas = {}
+    for venue in venues_list:
+        location = (venue.city, venue.state)
+        if location not in areas:
+            areas[location] = {'city': venue.city,
+                                'state': venue.state,
+                                'venues': [],
+                                'aggregated_shows': 0}
+        areas[location]['venues'].append(venue)
+        # To order the location in the main view
+        areas[location]['aggregated_shows'] += venue.num_upcoming_shows
+
+    return sorted(areas.values(), key=lambda x: x['aggregated_shows'],
+                  reverse=True)
+
+
+def search_by_name(model, user_query, page):
+    # Escape the wildcards, so that they are matched literally
+    escaped = user_query.replace('\\', '\\\\')\
+        .replace('%', '\\%').replace('_', '\\_')
+    pattern = '%{0}%'.format(escaped)
+
+    # Single statement per search, the total number of matches is counted
+    # with a window function next to the rows of the requested page.
+    refresh_upcoming_show_counts()
+    db_query = db.session.query(model.id,
+                                model.name,
+                                model.num_upcoming_shows,
+                                func.count().over().label("total")
                                 )\
-        .filter(Venue.name.ilike(pattern))\
-        .outerjoin(Show).group_by(Venue)
+        .filter(model.name.ilike(pattern, escape='\\'))\
+        .order_by(model.name, model.id)\
+        .limit(SEARCH_RESULTS_PER_PAGE)\
+        .offset((page - 1) * SEARCH_RESULTS_PER_PAGE)
 
     data = []
+    total = 0
     for entry in db_query.all():
-        data.append(entry._asdict())
+        entry = entry._asdict()
+        total = entry.pop('total')
+        data.append(entry)
+
+    return {"count": total,
+            "data": data,
+            "page": page,
+            "pages": ceil(total / SEARCH_RESULTS_PER_PAGE)}
 
-    response = {"count": len(data), "data": data}
 
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+def get_search_page():
+    page = request.form.get('page', 1, int)
+    return page if page > 0 else 1
 
 
-def get_show_with_artist_info(shows):
-    show_info = []
-    for show in shows:
-        show_info.append({**show[1].__dict__, **show._asdict()})
-        show_info[-1]['start_time'] = babel.dates.format_datetime(
-            show_info[-1]['start_time'], "yyyy-MM-dd HH:mm:ss")
-    return show_info
+@app.route('/venues/search', methods=['POST'])
+def search_venues():
 
-# Correction function to deal with arrays and incompatible naming of column
+    user_query = request.form.get('search_term', '')
+    response = search_by_name(Venue, user_query, get_search_page())
+
+    return render_template('pages/search_venues.html', results=response, search_term=user_query)
+
+
+def split_shows(rows, entity):
+    # Partition the shows of a detail page into upcoming and past ones, in a
+    # single pass over the rows of its query
+    now = datetime.utcnow()
+    upcoming, past = [], []
+    for row in rows:
+        show = row._asdict()
+        del show[entity]
+        # The outer join yields a single empty show without any shows
+        if show['start_time'] is None:
+            continue
+        (upcoming if show['start_time'] >= now else past).append(show)
+    return upcoming, past
+
+
+def add_shows(data, rows, entity):
+    data['upcoming_shows'], data['past_shows'] = split_shows(rows, entity)
+    data['upcoming_shows_count'] = len(data['upcoming_shows'])
+    data['past_shows_count'] = len(data['past_shows'])
+    return data
+
+# Correction function to deal with incompatible naming of column
 
 
 def correct_venue_entry(data):
-    data['genres'] = data['genres'].split(',')
     data['website'] = data.pop('website_link')
     return data
 
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached()
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
+    # The venue and all its shows with their artist come in one query
+    rows = db.session.query(Venue,
+                            Show.start_time,
+                            Artist.id.label("artist_id"),
+                            Artist.name.label("artist_name"),
+                            Artist.image_link.label("artist_image_link"))\
+        .outerjoin(Show, Show.venue_id == Venue.id)\
+        .outerjoin(Artist, Artist.id == Show.artist_id)\
+        .filter(Venue.id == venue_id)\
+        .order_by(Show.start_time).all()
+
+    if not rows:
+        abort(404)
+
+    data = correct_venue_entry(dict(rows[0].Venue.__dict__))
+    return render_template('pages/show_venue.html',
+                           venue=add_shows(data, rows, 'Venue'))
+
+#  Writes
+#  ----------------------------------------------------------------
 
-    query = db.session.query(Venue,
-                             Show,
-                             Artist.id.label("artist_id"),
-                             Artist.name.label("artist_name"),
-                             Artist.image_link.label("artist_image_link"))\
-        .join(Venue).join(Artist).filter(Show.venue_id == venue_id)
 
-    # Just in case a venue has never hosted a show
-    if query.count() == 0:
-        return render_template('pages/show_venue.html',
-                               venue=correct_venue_entry(Venue.query.get(venue_id).__dict__))
+@contextmanager
+def unit_of_work():
+    # The single transaction of a write request. It is committed when the
+    # block ends and rolled back if it raises. Either way the session is
+    # closed, returning its connection to the pool before the response is
+    # rendered, so handlers must not touch their models after the block.
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+    page_cache.clear()
 
-    data = correct_venue_entry(query.first()[0].__dict__)
 
-    upcoming = query.filter(Show.start_time >= datetime.utcnow())
-    data['upcoming_shows_count'] = upcoming.count()
-    data['upcoming_shows'] = get_show_with_artist_info(upcoming)
+def delete_by_id(model, id):
+    # Deletes a row and tells whether it existed, in a single statement
+    statement = model.__table__.delete().where(model.id == id)
+    if db.engine.dialect.name == 'postgresql':
+        return db.session.execute(
+            statement.returning(model.id)).first() is not None
+    return db.session.execute(statement).rowcount == 1
 
-    past = query.filter(Show.start_time < datetime.utcnow())
-    data['past_shows_count'] = past.count()
-    data['past_shows'] = get_show_with_artist_info(past)
 
-    return render_template('pages/show_venue.html', venue=data)
+def update_by_id(model, id, values):
+    # Updates a row and tells whether it existed, in a single statement
+    return db.session.query(model).filter(model.id == id)\
+        .update(values, synchronize_session=False) == 1
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -272,26 +583,22 @@ def create_venue_submission():
         flash(form.errors)
         return redirect(url_for('create_venue_form'))
 
+    new_values = request.form
     try:
-        new_values = request.form
-        new_venue = Venue(
-            name=new_values.get('name'),
-            city=new_values.get('city'),
-            state=new_values.get('state'),
-            phone=new_values.get('phone'),
-            address=new_values.get('address'),
-            facebook_link=new_values.get('facebook_link'),
-            image_link=new_values.get('image_link'),
-            genres=','.join(new_values.getlist('genres')))
-        db.session.add(new_venue)
-        db.session.commit()
+        with unit_of_work() as session:
+            session.add(Venue(
+                name=new_values.get('name'),
+                city=new_values.get('city'),
+                state=new_values.get('state'),
+                phone=new_values.get('phone'),
+                address=new_values.get('address'),
+                facebook_link=new_values.get('facebook_link'),
+                image_link=new_values.get('image_link'),
+                genres=new_values.getlist('genres')))
     except Exception as e:
-        db.session.rollback()
         flash('Venue ' + request.form['name'] +
               ' not listed! An exception occurred in the system :(')
         raise e
-    finally:
-        db.session.close()
 
     # on successful db insert, flash success
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
@@ -300,101 +607,73 @@ def create_venue_submission():
 
 @app.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-    if Venue.query.get(venue_id) is None:
-        flash("There is nothing to delete!")
-        return json.dumps({'success': False}), 400
-
-    response = (False, 500)
     try:
-        Venue.query.filter_by(id=venue_id).delete()
-        db.session.commit()
-        response = (True, 200)
-        flash("Your venue entry was successfully deleted!")
-    except:
-        db.session.rollback()
+        with unit_of_work():
+            forget_upcoming_shows(Show.venue_id == venue_id)
+            deleted = delete_by_id(Venue, venue_id)
+    except Exception:
         flash("Something went wrong. Your venue could not be deleted :(")
-    finally:
-        db.session.close()
+        return json.dumps({'success': False}), 500
+
+    if not deleted:
+        flash("There is nothing to delete!")
+        return json.dumps({'success': False}), 400
 
-    return json.dumps({'success': response[0]}), response[1]
+    flash("Your venue entry was successfully deleted!")
+    return json.dumps({'success': True}), 200
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
 @app.route('/artists')
+@page_cache.cached()
 def artists():
-    return render_template('pages/artists.html', artists=Artist.query.all())
+    artist_data = Artist.query
+    genre = request.args.get('genre')
+    if genre:
+        artist_data = artist_data.filter(has_genre(Artist, genre))
+    return render_template('pages/artists.html', artists=artist_data.all())
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
 
     user_query = request.form.get('search_term', '')
-    pattern = '%{0}%'.format(user_query)
-
-    db_query = db.session.query(Artist.id,
-                                Artist.name, func.count(Show.id)
-                                .filter(Show.start_time >= datetime.utcnow())
-                                .label("num_upcoming_shows")
-                                )\
-        .filter(Artist.name.ilike(pattern))\
-        .outerjoin(Show).group_by(Artist)
-
-    print(db_query.all())
-
-    data = []
-    for entry in db_query.all():
-        data.append(entry._asdict())
-
-    response = {"count": len(data), "data": data}
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    response = search_by_name(Artist, user_query, get_search_page())
 
+    return render_template('pages/search_artists.html', results=response, search_term=user_query)
 
-def get_show_with_venue_info(shows):
-    show_info = []
-    for show in shows:
-        show_info.append({**show[1].__dict__,  # deep dictionary creation. Without it show will just end up as <Show id>
-                          **show._asdict()})
-        show_info[-1]['start_time'] = babel.dates.format_datetime(
-            show_info[-1]['start_time'], "yyyy-MM-dd HH:mm:ss")
-    return show_info
 
-# Correction function to deal with arrays and incompatible naming of column
+# Correction function to deal with incompatible naming of column
 
 
 def correct_artist_entry(data):
-    data['genres'] = data['genres'].split(',')
     data['website'] = data.pop('website_link')
     return data
 
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached()
 def show_artist(artist_id):
-    # shows the venue page with the given venue_id
-    query = db.session.query(
-        Artist,
-        Show,
-        Venue.id.label("venue_id"),
-        Venue.name.label("venue_name"),
-        Venue.image_link.label("venue_image_link"))\
-        .join(Artist).join(Venue).filter(Show.artist_id == artist_id)
-
-    # Just in case an artist has never had a show
-    if query.count() == 0:
-        return render_template('pages/show_artist.html',
-                               artist=correct_artist_entry(Artist.query.get(artist_id).__dict__))
-
-    data = correct_artist_entry(query.first()[0].__dict__)
-
-    upcoming_shows = query.filter(Show.start_time >= datetime.utcnow())
-    data['upcoming_shows_count'] = upcoming_shows.count()
-    data['upcoming_shows'] = get_show_with_venue_info(upcoming_shows.all())
-
-    past_shows = query.filter(Show.start_time < datetime.utcnow())
-    data['past_shows_count'] = past_shows.count()
-    data['past_shows'] = get_show_with_venue_info(past_shows.all())
-    return render_template('pages/show_artist.html', artist=data)
+    # shows the artist page with the given artist_id
+    # The artist and all their shows with their venue come in one query
+    rows = db.session.query(Artist,
+                            Show.start_time,
+                            Venue.id.label("venue_id"),
+                            Venue.name.label("venue_name"),
+                            Venue.image_link.label("venue_image_link"))\
+        .outerjoin(Show, Show.artist_id == Artist.id)\
+        .outerjoin(Venue, Venue.id == Show.venue_id)\
+        .filter(Artist.id == artist_id)\
+        .order_by(Show.start_time).all()
+
+    if not rows:
+        abort(404)
+
+    data = correct_artist_entry(dict(rows[0].Artist.__dict__))
+    return render_template('pages/show_artist.html',
+                           artist=add_shows(data, rows, 'Artist'))
 
 #  Update
 #  ----------------------------------------------------------------
@@ -417,22 +696,18 @@ def edit_artist_submission(artist_id):
         flash(form.errors)
         return redirect(url_for('edit_artist', artist_id=artist_id))
 
-    try:
-        new_values = request.form
-        artist = Artist.query.get(artist_id)
-        artist.name = new_values.get('name')
-        artist.city = new_values.get('city')
-        artist.state = new_values.get('state')
-        artist.phone = new_values.get('phone')
-        artist.facebook_link = new_values.get('facebook_link')
-        artist.image_link = new_values.get('image_link')
-        artist.genres = ','.join(new_values.getlist('genres'))
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        raise e
-    finally:
-        db.session.close()
+    new_values = request.form
+    with unit_of_work():
+        updated = update_by_id(Artist, artist_id, {
+            'name': new_values.get('name'),
+            'city': new_values.get('city'),
+            'state': new_values.get('state'),
+            'phone': new_values.get('phone'),
+            'facebook_link': new_values.get('facebook_link'),
+            'image_link': new_values.get('image_link'),
+            'genres': new_values.getlist('genres')})
+    if not updated:
+        abort(404)
 
     return redirect(url_for('show_artist', artist_id=artist_id))
 
@@ -454,23 +729,19 @@ def edit_venue_submission(venue_id):
         flash(form.errors)
         return redirect(url_for('edit_venue', venue_id=venue_id))
 
-    try:
-        new_values = request.form
-        venue = Venue.query.get(venue_id)
-        venue.name = new_values.get('name')
-        venue.city = new_values.get('city')
-        venue.state = new_values.get('state')
-        venue.address = new_values.get('address')
-        venue.phone = new_values.get('phone')
-        venue.facebook_link = new_values.get('facebook_link')
-        venue.image_link = new_values.get('image_link')
-        venue.genres = ','.join(new_values.getlist('genres'))
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        raise e
-    finally:
-        db.session.close()
+    new_values = request.form
+    with unit_of_work():
+        updated = update_by_id(Venue, venue_id, {
+            'name': new_values.get('name'),
+            'city': new_values.get('city'),
+            'state': new_values.get('state'),
+            'address': new_values.get('address'),
+            'phone': new_values.get('phone'),
+            'facebook_link': new_values.get('facebook_link'),
+            'image_link': new_values.get('image_link'),
+            'genres': new_values.getlist('genres')})
+    if not updated:
+        abort(404)
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  Create Artist
@@ -491,25 +762,21 @@ def create_artist_submission():
         flash(form.errors)
         return redirect(url_for('create_artist_form'))
 
+    new_values = request.form
     try:
-        new_values = request.form
-        new_artist = Artist(
-            name=new_values.get('name'),
-            city=new_values.get('city'),
-            state=new_values.get('state'),
-            phone=new_values.get('phone'),
-            facebook_link=new_values.get('facebook_link'),
-            image_link=new_values.get('image_link'),
-            genres=','.join(new_values.getlist('genres')))
-        db.session.add(new_artist)
-        db.session.commit()
+        with unit_of_work() as session:
+            session.add(Artist(
+                name=new_values.get('name'),
+                city=new_values.get('city'),
+                state=new_values.get('state'),
+                phone=new_values.get('phone'),
+                facebook_link=new_values.get('facebook_link'),
+                image_link=new_values.get('image_link'),
+                genres=new_values.getlist('genres')))
     except Exception as e:
-        db.session.rollback()
         flash('Artist ' + request.form['name'] +
               ' not listed! An exception occurred in the system :(')
         raise e
-    finally:
-        db.session.close()
 
     # on successful db insert, flash success
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
@@ -518,46 +785,80 @@ def create_artist_submission():
 
 @app.route('/artists/<artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
-    if Artist.query.get(artist_id) is None:
-        flash("There is nothing to delete!")
-        return json.dumps({'success': False}), 400
-
-    response = (False, 500)
     try:
-        Artist.query.filter_by(id=artist_id).delete()
-        db.session.commit()
-        response = (True, 200)
-        flash("Your venue entry was successfully deleted!")
-    except:
-        db.session.rollback()
+        with unit_of_work():
+            forget_upcoming_shows(Show.artist_id == artist_id)
+            deleted = delete_by_id(Artist, artist_id)
+    except Exception:
         flash("Something went wrong. Your venue could not be deleted :(")
-    finally:
-        db.session.close()
+        return json.dumps({'success': False}), 500
 
-    return json.dumps({'success': response[0]}), response[1]
+    if not deleted:
+        flash("There is nothing to delete!")
+        return json.dumps({'success': False}), 400
+
+    flash("Your venue entry was successfully deleted!")
+    return json.dumps({'success': True}), 200
 
 #  Shows
 #  ----------------------------------------------------------------
 
 
+def stream_template(template_name, **context):
+    # Renders the template piece by piece, as its variables are iterated
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return template.generate(context)
+
+
 @app.route('/shows')
+@page_cache.cached()
 def shows():
     # displays list of shows at /shows
-    query = db.session.query(Venue.id.label("venue_id"),
+    # Only upcoming shows by default, ?past=1 lists the past ones as well.
+    # Shows are ordered by (start_time, id) and paginated on a cursor made
+    # of the last show of the previous page: ?after_time=...&after_id=...
+    # ?stream=1 renders the whole listing, sending the page while the rows
+    # are still being read.
+    include_past = request.args.get('past', 0, int) == 1
+    stream = request.args.get('stream', 0, int) == 1
+    after_time = request.args.get('after_time', None, datetime.fromisoformat)
+    after_id = request.args.get('after_id', None, int)
+
+    query = db.session.query(Show.id,
+                             Venue.id.label("venue_id"),
                              Venue.name.label("venue_name"),
                              Artist.id.label("artist_id"),
                              Artist.name.label("artist_name"),
                              Artist.image_link.label("artist_image_link"),
-                             Show.start_time).join(Venue).join(Artist).all()
-
-    def transform_info(result):
-        result = result._asdict()
-        result['start_time'] = babel.dates.format_datetime(
-            result['start_time'], "yyyy-MM-dd HH:mm:ss")
-        return result
-
-    data = list(map(lambda x: transform_info(x), query))
-    return render_template('pages/shows.html', shows=data)
+                             Show.start_time).join(Venue).join(Artist)\
+        .order_by(Show.start_time, Show.id)
+    if not include_past:
+        query = query.filter(Show.start_time >= datetime.utcnow())
+    if after_time is not None and after_id is not None:
+        query = query.filter(
+            tuple_(Show.start_time, Show.id) > tuple_(after_time, after_id))
+
+    # start_time stays a datetime, the template filter formats it
+    if stream:
+        data = query.yield_per(SHOWS_PER_PAGE)
+        queries_while_streaming()
+        return Response(stream_with_context(
+            stream_template('pages/shows.html', shows=data,
+                            include_past=include_past)))
+
+    # One more row than displayed tells whether there is a next page
+    rows = query.limit(SHOWS_PER_PAGE + 1).all()
+    next_page = None
+    if len(rows) > SHOWS_PER_PAGE:
+        rows = rows[:SHOWS_PER_PAGE]
+        next_page = {'after_time': rows[-1].start_time.isoformat(),
+                     'after_id': rows[-1].id}
+        if include_past:
+            next_page['past'] = 1
+
+    return render_template('pages/shows.html', shows=rows,
+                           include_past=include_past, next_page=next_page)
 
 
 @app.route('/shows/create')
@@ -572,30 +873,22 @@ def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing
     # form
 
+    # Checked before the unit of work, so that a rejected show neither
+    # commits nor clears the page cache
     artist = Artist.query.get(int(request.form.get('artist_id')))
     if artist is None:
-        success = False
         flash('Show could not be listed :(' + "Artist id does not exist")
         return redirect(url_for('create_shows'))
 
     venue = Venue.query.get(int(request.form.get('venue_id')))
     if venue is None:
-        success = False
         flash('Show could not be listed :(' + "Venue id does not exist")
         return redirect(url_for('create_shows'))
 
-    # Self TODO: add constraint that a venue and artist should have matching
-    # genres to have a valid show.
-    try:
-        show = Show(artist, venue, time=request.form.get('start_time'))
-        db.session.add(show)
-        db.session.commit()
-        print(show)
-    except Exception as e:
-        db.session.rollback()
-        raise e
-    finally:
-        db.session.close()
+    with unit_of_work() as session:
+        # Self TODO: add constraint that a venue and artist should have
+        # matching genres to have a valid show.
+        session.add(Show(artist, venue, time=request.form.get('start_time')))
 
     flash('Show was successfully listed!')
     return render_template('pages/home.html')
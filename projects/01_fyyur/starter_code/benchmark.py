@@ -0,0 +1,237 @@
+'''
+Benchmarks for the queries behind the Fyyur views.
+
+The benchmarks drop and recreate every table, so they must be pointed to a
+scratch database and never to the development one:
+
+    createdb fyyur_bench
+    DATABASE_URL=postgres:///fyyur_bench python benchmark.py
+
+Every benchmark reports the number of statements executed per request, next
+to the wall clock time, since the former is what should stay flat as the
+data grows.
+'''
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+
+from app import app, db, Venue, Artist, Show, format_datetime, \
+    format_datetime_cached, DATETIME_FORMATS
+from importer import import_file
+from fsnd_common.db_pool import engine_options
+from loadtest import percentile
+
+CHUNK_SIZE = 100000
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def reset_db():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+
+def seed(locations, venues_per_location=2, shows_per_venue=2):
+    db.session.bulk_insert_mappings(Artist, [{
+        'name': f'Artist {i}',
+        'city': f'City {i}',
+        'state': 'CA',
+        'genres': ['Jazz']} for i in range(locations)])
+    db.session.bulk_insert_mappings(Venue, [{
+        'name': f'Venue {i}-{j}',
+        'city': f'City {i}',
+        'state': 'CA',
+        'genres': ['Jazz']}
+        for i in range(locations) for j in range(venues_per_location)])
+    db.session.commit()
+
+    venue_ids = [venue_id for venue_id, in db.session.query(Venue.id)]
+    artist_ids = [artist_id for artist_id, in db.session.query(Artist.id)]
+    now = datetime.utcnow()
+    shows = len(venue_ids) * shows_per_venue
+    for start in range(0, shows, CHUNK_SIZE):
+        db.session.bulk_insert_mappings(Show, [{
+            'venue_id': venue_ids[n % len(venue_ids)],
+            'artist_id': artist_ids[n % len(artist_ids)],
+            # Spread over two years, half of the shows in the past.
+            'start_time': now + timedelta(hours=(n * 7919) % 17520 - 8760)}
+            for n in range(start, min(shows, start + CHUNK_SIZE))])
+        db.session.commit()
+
+
+def timed_request(client, method, url, **kwargs):
+    with count_queries() as statements:
+        start = time.perf_counter()
+        res = client.open(url, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+    assert res.status_code == 200, res.status_code
+    return len(statements), elapsed
+
+
+def bench_venues(client):
+    for locations in (10, 100, 1000, 5000):
+        reset_db()
+        seed(locations)
+        queries, elapsed = timed_request(client, 'GET', '/venues')
+        print(f'/venues  locations={locations:>5}  queries={queries:>3}  '
+              f'{elapsed * 1000:8.1f} ms')
+
+
+def bench_search(client, rows=500000):
+    reset_db()
+    seed(rows, venues_per_location=1, shows_per_venue=1)
+    for url in ('/venues/search', '/artists/search'):
+        for term in ('1234', 'Venue 49999', 'Artist', 'nothing'):
+            queries, elapsed = timed_request(
+                client, 'POST', url, data={'search_term': term})
+            print(f'{url:<16} rows={rows} term={term!r:<14} '
+                  f'queries={queries:>3}  {elapsed * 1000:8.1f} ms')
+
+
+def explain(statement, parameters):
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        return [line for line, in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def bench_explain(client, locations=100000, shows_per_venue=10):
+    # Prints the plan of every statement run by the routes, to check that
+    # the Show table is read through its indexes rather than scanned.
+    if db.engine.dialect.name != 'postgresql':
+        print('EXPLAIN benchmark skipped, it needs PostgreSQL')
+        return
+    reset_db()
+    seed(locations, shows_per_venue=shows_per_venue)
+    db.session.execute('ANALYZE')
+    db.session.commit()
+    venue_id = db.session.query(Venue.id).first()[0]
+    artist_id = db.session.query(Artist.id).first()[0]
+    for url in ('/venues', '/shows', f'/venues/{venue_id}',
+                f'/artists/{artist_id}'):
+        with count_queries() as statements:
+            client.get(url)
+        print(url)
+        for statement, parameters in statements:
+            plan = explain(statement, parameters)
+            print('  ' + ' '.join(statement.split())[:100])
+            for line in plan:
+                if 'Scan' in line:
+                    flag = '  <-- sequential scan of Show' \
+                        if 'Seq Scan on "Show"' in line else ''
+                    print('    ' + line.strip() + flag)
+
+
+def format_datetime_reparsing(value, format='full'):
+    # What the views and the datetime filter did before
+    value = babel.dates.format_datetime(value, "yyyy-MM-dd HH:mm:ss")
+    return babel.dates.format_datetime(dateutil.parser.parse(value),
+                                       DATETIME_FORMATS[format])
+
+
+def bench_format_datetime(rows=10000, distinct=200):
+    now = datetime.utcnow()
+    for label, values in (
+            (f'{distinct} distinct', [now + timedelta(hours=n % distinct)
+                                      for n in range(rows)]),
+            ('all distinct', [now + timedelta(hours=n)
+                              for n in range(rows)])):
+        for name, function in (('reparsing', format_datetime_reparsing),
+                               ('cached', format_datetime)):
+            format_datetime_cached.cache_clear()
+            start = time.perf_counter()
+            for value in values:
+                function(value, 'full')
+            elapsed = time.perf_counter() - start
+            print(f'format_datetime {rows} rows, {label:<13} {name:<10} '
+                  f'{elapsed * 1000:8.1f} ms')
+
+
+def bench_import(rows=100000):
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='',
+                                     delete=False) as source:
+        writer = csv.writer(source)
+        writer.writerow(['name', 'city', 'state', 'address', 'phone',
+                         'genres', 'facebook_link'])
+        for n in range(rows):
+            writer.writerow([f'Venue {n}', f'City {n % 1000}', 'CA',
+                             f'{n} Main Street', '415-456-7890', 'Jazz,Folk',
+                             ''])
+    try:
+        for chunk_size in (100, 1000, 10000):
+            reset_db()
+            start = time.perf_counter()
+            imported, rejected = import_file('venues', source.name,
+                                             chunk_size, out=io.StringIO())
+            elapsed = time.perf_counter() - start
+            print(f'import venues rows={rows} chunk_size={chunk_size:>5}  '
+                  f'{imported / elapsed:8.0f} rows/s')
+    finally:
+        os.remove(source.name)
+
+
+def checkout_latency(engine):
+    # What every request pays before and for its first statement
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+    return time.perf_counter() - start
+
+
+def bench_pool(checkouts=500, concurrency=(1, 8)):
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    for name, options in (('pooled', engine_options(uri)),
+                          ('NullPool', {'poolclass': NullPool})):
+        engine = create_engine(uri, **options)
+        for threads in concurrency:
+            with ThreadPoolExecutor(threads) as pool:
+                latencies = sorted(
+                    elapsed * 1000 for elapsed in
+                    pool.map(checkout_latency, [engine] * checkouts))
+            print(f'connect + SELECT 1 {name:<8} threads={threads:>2}  '
+                  f'p50={percentile(latencies, 50):7.2f} ms  '
+                  f'p95={percentile(latencies, 95):7.2f} ms  '
+                  f'p99={percentile(latencies, 99):7.2f} ms')
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    # Does not need the database
+    bench_format_datetime()
+
+    if 'DATABASE_URL' not in os.environ:
+        sys.exit('Set DATABASE_URL to a scratch database. '
+                 'The benchmark drops all tables.')
+    client = app.test_client()
+    bench_venues(client)
+    bench_search(client)
+    bench_explain(client)
+    bench_import()
+    bench_pool()
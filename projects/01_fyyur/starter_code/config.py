@@ -1,5 +1,7 @@
 import os
 
+from fsnd_common.db_pool import engine_options
+
 
 class DefaultConfig():
     SECRET_KEY = os.urandom(32)
@@ -8,4 +10,13 @@ class DefaultConfig():
     # Enable debug mode.
     DEBUG = True
     # Connect to the database
-    SQLALCHEMY_DATABASE_URI = 'postgres:///fyyur'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres:///fyyur')
+    # Cache of rendered pages, 'lru', 'redis' or empty to disable it
+    PAGE_CACHE = os.environ.get('PAGE_CACHE', 'lru') or None
+    PAGE_CACHE_REDIS_URL = os.environ.get('REDIS_URL',
+                                          'redis://localhost:6379/0')
+    # Pool settings from the environment, see fsnd_common/db_pool.py
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # Batch the executemany of bulk inserts into multi-row INSERT statements
+    if SQLALCHEMY_DATABASE_URI.startswith('postgres'):
+        SQLALCHEMY_ENGINE_OPTIONS['executemany_mode'] = 'values'
@@ -0,0 +1,167 @@
+'''
+Bulk import of venues, artists and shows, used by `flask import`:
+
+    flask import venues venues.csv
+    flask import shows shows.jsonl --chunk-size 5000
+
+Files are either CSV with a header row, or JSON lines (.jsonl) with one
+object per line. Genres are a list in JSON lines files and comma separated
+in CSV files. Shows reference existing venue_id and artist_id values and
+start at a start_time formatted as YYYY-MM-DD HH:MM:SS.
+
+Rows are streamed from the file and validated with the same forms as the
+web pages, including the phone number check. Valid rows are inserted with
+one executemany per chunk, invalid ones are reported and skipped.
+'''
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+import click
+from werkzeug.datastructures import MultiDict
+
+from app import app, db, Venue, Artist, Show, get_counted_at, \
+    shift_upcoming_show_counts, page_cache
+from forms import VenueForm, ArtistForm, ShowForm
+
+# Columns which the forms do not cover, imported as they are. Every record
+# of a chunk has all of them, as executemany binds the same parameters for
+# every row.
+EXTRA_COLUMNS = {
+    'venues': ['website_link', 'seeking_talent', 'seeking_description'],
+    'artists': ['website_link', 'seeking_venue', 'seeking_description'],
+    'shows': [],
+}
+BOOLEAN_COLUMNS = {'seeking_talent', 'seeking_venue'}
+
+FORMS = {'venues': VenueForm, 'artists': ArtistForm, 'shows': ShowForm}
+MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+
+
+def read_rows(path):
+    # Yields (line number, row) pairs without loading the whole file
+    with open(path, newline='') as source:
+        if path.endswith('.jsonl'):
+            for line_number, line in enumerate(source, 1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+        else:
+            # The header is line 1
+            for line_number, row in enumerate(csv.DictReader(source), 2):
+                yield line_number, row
+
+
+def to_formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if key == 'genres':
+            if isinstance(value, str):
+                value = value.split(',')
+            for genre in value:
+                formdata.add(key, genre.strip())
+        elif value is not None:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def to_boolean(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def validate(kind, row):
+    # Returns the record to insert, or None and the validation errors
+    if kind == 'shows' and row.get('start_time') in (None, ''):
+        # ShowForm would fill in its default, the time forms.py was imported
+        return None, {'start_time': ['This field is required.']}
+    form = FORMS[kind](formdata=to_formdata(row), meta={'csrf': False})
+    try:
+        if not form.validate():
+            return None, form.errors
+    except Exception as e:
+        # e.g. phonenumbers failing to parse an empty number
+        return None, {'row': [str(e)]}
+
+    if kind == 'shows':
+        try:
+            return {'venue_id': int(form.venue_id.data),
+                    'artist_id': int(form.artist_id.data),
+                    'start_time': form.start_time.data}, None
+        except (TypeError, ValueError):
+            return None, {'row': ['venue_id and artist_id must be numbers']}
+
+    record = {name: field.data for name, field in form._fields.items()}
+    for column in EXTRA_COLUMNS[kind]:
+        value = row.get(column)
+        if column in BOOLEAN_COLUMNS:
+            record[column] = to_boolean(value)
+        else:
+            record[column] = None if value in (None, '') else value
+    return record, None
+
+
+def insert_shows(records):
+    # Shows referencing unknown venues or artists are dropped, the others
+    # are counted in the upcoming show counters like the form does.
+    connection = db.session.connection()
+    venue_ids = {id for id, in db.session.query(Venue.id).filter(
+        Venue.id.in_({record['venue_id'] for record in records}))}
+    artist_ids = {id for id, in db.session.query(Artist.id).filter(
+        Artist.id.in_({record['artist_id'] for record in records}))}
+    valid = [record for record in records
+             if record['venue_id'] in venue_ids and
+             record['artist_id'] in artist_ids]
+    if valid:
+        connection.execute(Show.__table__.insert(), valid)
+        counted_at = get_counted_at(connection, for_update=True)
+        if counted_at is not None:
+            shift_upcoming_show_counts(connection, [
+                (record['venue_id'], record['artist_id'])
+                for record in valid if record['start_time'] >= counted_at],
+                1)
+    return len(valid)
+
+
+def insert_chunk(kind, records):
+    if not records:
+        return 0
+    if kind == 'shows':
+        inserted = insert_shows(records)
+    else:
+        db.session.execute(MODELS[kind].__table__.insert(), records)
+        inserted = len(records)
+    db.session.commit()
+    page_cache.clear()
+    return inserted
+
+
+def import_file(kind, path, chunk_size=1000, out=sys.stdout):
+    imported = rejected = 0
+    start = time.perf_counter()
+    rows = read_rows(path)
+    with app.test_request_context():
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            records = []
+            for line_number, row in chunk:
+                record, errors = validate(kind, row)
+                if record is None:
+                    rejected += 1
+                    click.echo(f'line {line_number}: {errors}', err=True)
+                else:
+                    records.append(record)
+            inserted = insert_chunk(kind, records)
+            imported += inserted
+            if inserted < len(records):
+                rejected += len(records) - inserted
+                click.echo(f'{len(records) - inserted} shows reference '
+                           'unknown venues or artists', err=True)
+            elapsed = time.perf_counter() - start
+            click.echo(f'{imported} {kind} imported, {rejected} rejected, '
+                       f'{imported / elapsed:.0f} rows/s', file=out)
+    return imported, rejected
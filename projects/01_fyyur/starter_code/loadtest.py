@@ -0,0 +1,124 @@
+'''
+Load test of the Fyyur pages, reporting the latency percentiles and the
+number of SQL statements per route.
+
+Requests are sent through the Flask test client by a pool of threads, each
+request running its statements in the thread which sent it. Point it to a
+database filled by synthetic_data.py:
+
+    DATABASE_URL=postgres:///fyyur_load python synthetic_data.py --reset
+    DATABASE_URL=postgres:///fyyur_load python loadtest.py \
+        --requests 2000 --concurrency 8
+
+The routes are requested in a random, seeded order, with random detail page
+ids and search terms.
+'''
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+
+from sqlalchemy import event
+
+from app import app, db, Venue, Artist
+from synthetic_data import NAME_WORDS
+
+ROUTES = ['/venues', '/artists', '/shows', '/venues/search',
+          '/artists/search', '/venues/<id>', '/artists/<id>']
+
+local = threading.local()
+
+
+def count_statement(conn, cursor, statement, parameters, context,
+                    executemany):
+    local.statements = getattr(local, 'statements', 0) + 1
+
+
+def percentile(values, percent):
+    # Nearest rank on sorted values
+    return values[max(ceil(percent / 100 * len(values)), 1) - 1]
+
+
+class LoadTest:
+    def __init__(self, requests=1000, concurrency=4, seed=0):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        self.venue_ids = [id for id, in db.session.query(Venue.id)]
+        self.artist_ids = [id for id, in db.session.query(Artist.id)]
+        db.session.remove()
+        if not self.venue_ids or not self.artist_ids:
+            raise SystemExit('The database has no venues or artists, '
+                             'fill it with synthetic_data.py first.')
+
+    def plan(self):
+        # Decided up front, so that every run sends the same requests
+        for _ in range(self.requests):
+            route = self.random.choice(ROUTES)
+            if route == '/venues/<id>':
+                url = f'/venues/{self.random.choice(self.venue_ids)}'
+                yield route, 'GET', url, None
+            elif route == '/artists/<id>':
+                url = f'/artists/{self.random.choice(self.artist_ids)}'
+                yield route, 'GET', url, None
+            elif route.endswith('/search'):
+                yield route, 'POST', route, \
+                    {'search_term': self.random.choice(NAME_WORDS)}
+            else:
+                yield route, 'GET', route, None
+
+    def send(self, request):
+        route, method, url, data = request
+        client = app.test_client()
+        local.statements = 0
+        start = time.perf_counter()
+        res = client.open(url, method=method, data=data)
+        elapsed = time.perf_counter() - start
+        return route, res.status_code, elapsed, local.statements
+
+    def run(self):
+        results = defaultdict(list)
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(self.concurrency) as pool:
+                for route, status, elapsed, statements in \
+                        pool.map(self.send, list(self.plan())):
+                    results[route].append((status, elapsed, statements))
+            total = time.perf_counter() - start
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+        return results, total
+
+    def report(self, results, total):
+        print(f'{self.requests} requests, {self.concurrency} threads, '
+              f'{self.requests / total:.0f} requests/s')
+        print(f'{"route":<16} {"count":>6} {"errors":>6} {"p50 ms":>8} '
+              f'{"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"max":>4}')
+        for route in ROUTES:
+            if not results[route]:
+                continue
+            latencies = sorted(elapsed * 1000 for _, elapsed, _
+                               in results[route])
+            statements = [count for *_, count in results[route]]
+            errors = sum(status != 200 for status, *_ in results[route])
+            print(f'{route:<16} {len(latencies):>6} {errors:>6} '
+                  f'{percentile(latencies, 50):8.1f} '
+                  f'{percentile(latencies, 95):8.1f} '
+                  f'{percentile(latencies, 99):8.1f} '
+                  f'{sum(statements) / len(statements):8.1f} '
+                  f'{max(statements):>4}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    load_test = LoadTest(args.requests, args.concurrency, args.seed)
+    load_test.report(*load_test.run())
@@ -0,0 +1,31 @@
+"""composite indexes on shows
+
+Revision ID: 5d9a0c3e8f21
+Revises: 8e2b7d4c6a13
+Create Date: 2026-10-18 13:02:47.630915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9a0c3e8f21'
+down_revision = '8e2b7d4c6a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show',
+                    ['venue_id', 'start_time', 'artist_id'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show',
+                    ['artist_id', 'start_time', 'venue_id'], unique=False)
+    op.create_index('ix_Show_start_time_id', 'Show',
+                    ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
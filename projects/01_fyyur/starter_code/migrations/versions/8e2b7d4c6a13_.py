@@ -0,0 +1,44 @@
+"""upcoming show counters on venues and artists
+
+Revision ID: 8e2b7d4c6a13
+Revises: 3c1f5a9d2e47
+Create Date: 2026-10-18 11:40:05.118342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2b7d4c6a13'
+down_revision = '3c1f5a9d2e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('num_upcoming_shows', sa.Integer(),
+                                     server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('num_upcoming_shows', sa.Integer(),
+                                      server_default='0', nullable=False))
+    op.create_table('ShowCountState',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('counted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Initial count of the existing shows. now() is the same for every
+    # statement of the migration transaction.
+    op.execute('UPDATE "Venue" SET num_upcoming_shows = '
+               '(SELECT count(*) FROM "Show" WHERE "Show".venue_id = "Venue".id '
+               "AND \"Show\".start_time >= (now() AT TIME ZONE 'utc'))")
+    op.execute('UPDATE "Artist" SET num_upcoming_shows = '
+               '(SELECT count(*) FROM "Show" WHERE "Show".artist_id = "Artist".id '
+               "AND \"Show\".start_time >= (now() AT TIME ZONE 'utc'))")
+    op.execute('INSERT INTO "ShowCountState" (id, counted_at) '
+               "VALUES (1, now() AT TIME ZONE 'utc')")
+
+
+def downgrade():
+    op.drop_table('ShowCountState')
+    op.drop_column('Artist', 'num_upcoming_shows')
+    op.drop_column('Venue', 'num_upcoming_shows')
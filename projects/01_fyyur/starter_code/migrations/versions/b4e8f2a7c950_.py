@@ -0,0 +1,32 @@
+"""genres as indexed arrays
+
+Revision ID: b4e8f2a7c950
+Revises: 5d9a0c3e8f21
+Create Date: 2026-10-18 14:25:53.772604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e8f2a7c950'
+down_revision = '5d9a0c3e8f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Converts the comma joined genres of the existing rows in place
+    for table in ('Venue', 'Artist'):
+        op.execute(f'ALTER TABLE "{table}" ALTER COLUMN genres '
+                   "TYPE VARCHAR[] USING string_to_array(genres, ',')")
+        op.create_index(f'ix_{table}_genres', table, ['genres'],
+                        unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table}_genres', table_name=table)
+        op.execute(f'ALTER TABLE "{table}" ALTER COLUMN genres '
+                   "TYPE VARCHAR(120) USING array_to_string(genres, ',')")
@@ -0,0 +1,159 @@
+'''
+Cache of rendered pages
+
+    page_cache = PageCache(app)
+
+    @app.route('/artists')
+    @page_cache.cached()
+    def artists():
+        ...
+
+keeps the HTML of GET requests, keyed by path and query string, until
+page_cache.clear() is called by a handler which changed the data, or for at
+most PAGE_CACHE_TTL seconds (60 by default). The expiry also brings the
+split of shows into upcoming and past ones up to date, and bounds how long
+a process serves pages older than a write cleared in another process only.
+
+The backend is chosen with PAGE_CACHE:
+    'lru'    in-process cache of the PAGE_CACHE_SIZE most recent pages,
+             the default. Under several workers, a write only clears the
+             cache of the worker which served it
+    'redis'  shared by all processes, at PAGE_CACHE_REDIS_URL, needs the
+             redis package
+    None     disables the cache
+
+Every clear() starts a new generation of the cache, and a page is only
+stored if no clear() happened while it was being rendered, so a render
+racing with a write never stores the page from before the write.
+
+Pages rendered while flashed messages are pending are never cached, as
+those messages are meant for a single user.
+'''
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session
+
+
+class LRUBackend:
+    def __init__(self, maxsize=1024, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._pages = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            page, expires_at = entry
+            if expires_at is not None and self.clock() >= expires_at:
+                del self._pages[key]
+                return None
+            self._pages.move_to_end(key)
+            return page
+
+    def set(self, key, page, ttl=None, generation=None):
+        expires_at = None if ttl is None else self.clock() + ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._pages[key] = (page, expires_at)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._generation += 1
+
+
+class RedisBackend:
+    # Pages are stored under the generation they were rendered in, so that
+    # clear() is a single INCR and the pages of older generations are never
+    # read again, until they expire.
+    def __init__(self, client, prefix='fyyur:page:'):
+        self.client = client
+        self.prefix = prefix
+
+    def generation(self):
+        return int(self.client.get(self.prefix + 'generation') or 0)
+
+    def _key(self, key, generation):
+        return f'{self.prefix}{generation}:{key}'
+
+    def get(self, key):
+        page = self.client.get(self._key(key, self.generation()))
+        return None if page is None else page.decode()
+
+    def set(self, key, page, ttl=None, generation=None):
+        if generation is None:
+            generation = self.generation()
+        self.client.set(self._key(key, generation), page, ex=ttl)
+
+    def clear(self):
+        self.client.incr(self.prefix + 'generation')
+
+
+class PageCache:
+    def __init__(self, app=None, backend=None):
+        self.backend = backend
+        self.ttl = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE', 'lru')
+        app.config.setdefault('PAGE_CACHE_SIZE', 1024)
+        app.config.setdefault('PAGE_CACHE_TTL', 60)
+        app.config.setdefault('PAGE_CACHE_REDIS_URL',
+                              'redis://localhost:6379/0')
+        self.ttl = app.config['PAGE_CACHE_TTL']
+        if self.backend is not None:
+            return
+
+        kind = app.config['PAGE_CACHE']
+        if kind == 'lru':
+            self.backend = LRUBackend(app.config['PAGE_CACHE_SIZE'])
+        elif kind == 'redis':
+            # Optional dependency, only needed for this backend
+            import redis
+            self.backend = RedisBackend(
+                redis.Redis.from_url(app.config['PAGE_CACHE_REDIS_URL']))
+        elif kind is not None:
+            raise ValueError(f'Unknown PAGE_CACHE backend {kind!r}')
+
+    def cached(self):
+        def decorator(view):
+            @wraps(view)
+            def cached_view(*args, **kwargs):
+                if self.backend is None or request.method != 'GET' or \
+                        session.get('_flashes'):
+                    return view(*args, **kwargs)
+
+                key = request.full_path
+                # Read before the page, so that a clear() during the render
+                # keeps the page out of the cache
+                generation = self.backend.generation()
+                page = self.backend.get(key)
+                if page is None:
+                    page = view(*args, **kwargs)
+                    # Streamed responses, redirects and errors are not kept
+                    if not isinstance(page, str):
+                        return page
+                    self.backend.set(key, page, self.ttl, generation)
+                return page
+            return cached_view
+        return decorator
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
@@ -8,7 +8,7 @@ state to mint easily and start over if I mess up.
 '''
 guns_n_petals = Artist(
 	name="Guns N Petals",
-	genres="Rock n Roll",
+	genres=["Rock n Roll"],
 	city="San Francisco",
 	state="CA",
     phone="326-123-5000",
@@ -20,7 +20,7 @@ guns_n_petals = Artist(
 
 matt_quevedo = Artist(
 	name="Matt Quevedo",
-	genres="Jazz",
+	genres=["Jazz"],
     city="New York",
     state="NY",
     phone="300-400-5000",
@@ -30,7 +30,7 @@ matt_quevedo = Artist(
 
 wild_sax = Artist(
 	name="The Wild Sax Band",
-    genres="Jazz,Classical",
+    genres=["Jazz", "Classical"],
     city="San Francisco",
     state="CA",
     phone="432-325-5432",
@@ -42,7 +42,7 @@ db.session.commit()
 
 musical_hop=Venue(
 	name="The Musical Hop",
-    genres="Jazz,Reggae,Swing,Classical,Folk",
+    genres=["Jazz", "Reggae", "Swing", "Classical", "Folk"],
     address="1015 Folsom Street",
     city="San Francisco",
     state="CA",
@@ -55,7 +55,7 @@ musical_hop=Venue(
 
 dueling_pianos=Venue(
 	name="The Dueling Pianos Bar",
-    genres="Classical,R&B,Hip-Hop",
+    genres=["Classical", "R&B", "Hip-Hop"],
     address="335 Delancey Street",
     city="New York",
     state="NY",
@@ -67,7 +67,7 @@ dueling_pianos=Venue(
 
 park_square=Venue(
 	name="Park Square Live Music & Coffee",
-    genres="Rock n Roll,Jazz,Classical,Folk",
+    genres=["Rock n Roll", "Jazz", "Classical", "Folk"],
     address="34 Whiskey Moore Ave",
     city="San Francisco",
     state="CA",
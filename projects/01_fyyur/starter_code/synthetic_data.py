@@ -0,0 +1,195 @@
+'''
+Generates a Fyyur database of any size, for load tests and benchmarks:
+
+    DATABASE_URL=postgres:///fyyur_load python synthetic_data.py \
+        --venues 10000 --artists 50000 --shows 1000000 --seed 1
+
+The same seed always produces the same rows, with the show times relative to
+the day the script runs. Cities are weighted by population, so that a few of
+them hold most of the venues like on the real site, every venue or artist
+plays one to three genres with the popular ones more likely, and a few
+popular venues and artists get most of the shows. Shows start in the
+evening, more often on weekends, and are spread over the past and the coming
+year.
+
+Existing rows are kept, run `python synthetic_data.py --reset` to start over
+from empty tables.
+'''
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from app import app, db, Venue, Artist, Show, recount_upcoming_shows
+from forms import VenueForm
+
+CHUNK_SIZE = 10000
+
+# (city, state, area code, weight)
+CITIES = [
+    ('New York', 'NY', '212', 84),
+    ('Los Angeles', 'CA', '213', 39),
+    ('Chicago', 'IL', '312', 27),
+    ('Houston', 'TX', '713', 23),
+    ('Phoenix', 'AZ', '602', 16),
+    ('Philadelphia', 'PA', '215', 16),
+    ('San Antonio', 'TX', '210', 15),
+    ('San Diego', 'CA', '619', 14),
+    ('Dallas', 'TX', '214', 13),
+    ('Austin', 'TX', '512', 10),
+    ('San Francisco', 'CA', '415', 9),
+    ('Seattle', 'WA', '206', 7),
+    ('Denver', 'CO', '303', 7),
+    ('Nashville', 'TN', '615', 7),
+    ('Boston', 'MA', '617', 7),
+    ('Portland', 'OR', '503', 6),
+    ('Las Vegas', 'NV', '702', 6),
+    ('Detroit', 'MI', '313', 6),
+    ('Atlanta', 'GA', '404', 5),
+    ('New Orleans', 'LA', '504', 4),
+]
+GENRES = [genre for genre, _ in VenueForm.genres.kwargs['choices']]
+
+NAME_WORDS = ['Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Silver',
+              'Wild', 'Red', 'Lucky', 'Broken', 'Sunset', 'Neon', 'Rolling',
+              'Hidden', 'Crystal', 'Iron', 'Little', 'Grand', 'Lost', 'Royal']
+VENUE_WORDS = ['Hall', 'Lounge', 'Club', 'Room', 'Tavern', 'Theater',
+               'Bar', 'Garden', 'Cellar', 'Stage']
+ARTIST_WORDS = ['Band', 'Quartet', 'Collective', 'Orchestra', 'Trio',
+                'Project', 'Brothers', 'Sisters', 'Ensemble', 'Crew']
+STREETS = ['Main Street', 'Market Street', 'Broadway', 'Oak Avenue',
+           'Elm Street', 'Mission Street', 'Sunset Boulevard', '5th Avenue']
+
+
+class Generator:
+    def __init__(self, seed=0, now=None):
+        self.random = random.Random(seed)
+        self.now = now or datetime.utcnow().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        self.city_weights = [weight for *_, weight in CITIES]
+        # Zipf-like popularity, the first genres are the most played
+        self.genre_weights = [1 / (rank + 1) for rank in range(len(GENRES))]
+
+    def name(self, words, number):
+        return ' '.join([self.random.choice(NAME_WORDS),
+                         self.random.choice(NAME_WORDS),
+                         self.random.choice(words)]) + f' {number}'
+
+    def genres(self):
+        count = self.random.choice([1, 1, 1, 2, 2, 3])
+        genres = set()
+        while len(genres) < count:
+            genres.update(self.random.choices(GENRES, self.genre_weights))
+        return sorted(genres)
+
+    def place(self):
+        city, state, area_code, _ = self.random.choices(
+            CITIES, self.city_weights)[0]
+        phone = f'{area_code}-{self.random.randint(200, 999)}-' \
+            f'{self.random.randint(0, 9999):04d}'
+        return city, state, phone
+
+    def venue(self, number):
+        city, state, phone = self.place()
+        seeking_talent = self.random.random() < 0.3
+        return {
+            'name': self.name(VENUE_WORDS, number),
+            'city': city,
+            'state': state,
+            'address': f'{self.random.randint(1, 9999)} '
+                       f'{self.random.choice(STREETS)}',
+            'phone': phone,
+            'genres': self.genres(),
+            'seeking_talent': seeking_talent,
+            'seeking_description': 'Looking for local artists'
+            if seeking_talent else None,
+        }
+
+    def artist(self, number):
+        city, state, phone = self.place()
+        seeking_venue = self.random.random() < 0.5
+        return {
+            'name': self.name(ARTIST_WORDS, number),
+            'city': city,
+            'state': state,
+            'phone': phone,
+            'genres': self.genres(),
+            'seeking_venue': seeking_venue,
+            'seeking_description': 'Looking for shows to perform at'
+            if seeking_venue else None,
+        }
+
+    def popularity(self, ids):
+        # Cumulative weights, a few ids get most of the shows
+        total = 0
+        cumulative = []
+        for _ in ids:
+            total += self.random.paretovariate(1.5)
+            cumulative.append(total)
+        return cumulative
+
+    def start_time(self):
+        day = self.now + timedelta(days=self.random.randint(-365, 365))
+        # Friday and Saturday nights are twice as likely
+        if day.weekday() not in (4, 5) and self.random.random() < 0.5:
+            day += timedelta(days=(4 - day.weekday()) % 7)
+        hour = self.random.choices([18, 19, 20, 21, 22, 23],
+                                   [1, 3, 4, 4, 2, 1])[0]
+        return day.replace(hour=hour, minute=self.random.choice([0, 30]))
+
+    def shows(self, count, venue_ids, artist_ids):
+        venue_weights = self.popularity(venue_ids)
+        artist_weights = self.popularity(artist_ids)
+        for _ in range(count):
+            yield {
+                'venue_id': self.random.choices(
+                    venue_ids, cum_weights=venue_weights)[0],
+                'artist_id': self.random.choices(
+                    artist_ids, cum_weights=artist_weights)[0],
+                'start_time': self.start_time(),
+            }
+
+
+def insert(table, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            db.session.execute(table.insert(), chunk)
+            db.session.commit()
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+
+
+def generate(venues, artists, shows, seed=0, now=None):
+    generator = Generator(seed, now)
+    insert(Venue.__table__, (generator.venue(n) for n in range(venues)))
+    insert(Artist.__table__, (generator.artist(n) for n in range(artists)))
+
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [id for id, in
+                  db.session.query(Artist.id).order_by(Artist.id)]
+    if shows and venue_ids and artist_ids:
+        insert(Show.__table__,
+               generator.shows(shows, venue_ids, artist_ids))
+    # The inserts above bypass the counters kept by the Show events
+    recount_upcoming_shows(db.session.connection(), datetime.utcnow())
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reset', action='store_true',
+                        help='drop and recreate all tables first')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            db.create_all()
+        generate(args.venues, args.artists, args.shows, args.seed)
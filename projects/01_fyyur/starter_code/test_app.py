@@ -0,0 +1,323 @@
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import babel.dates
+from sqlalchemy import event
+
+# Run against a throwaway database unless told otherwise
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app, db, Venue, Artist, Show, SHOWS_PER_PAGE, \
+    DATETIME_FORMATS, format_datetime, page_cache
+from page_cache import LRUBackend
+from importer import import_file
+from synthetic_data import Generator
+
+# The templates do not render CSRF tokens
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize the database."""
+        self.client = app.test_client
+        self.statements = []
+        page_cache.clear()
+        db.create_all()
+
+        artist = Artist(name="The Wild Sax Band", city="San Francisco",
+                        state="CA", genres=["Jazz", "Classical"])
+        venue = Venue(name="Park Square Live Music & Coffee",
+                      city="San Francisco", state="CA",
+                      genres=["Rock n Roll", "Jazz"])
+        db.session.add_all([artist, venue])
+        db.session.commit()
+        now = datetime.utcnow()
+        db.session.add_all([Show(artist, venue, now + timedelta(days=7)),
+                            Show(artist, venue, now + timedelta(days=14)),
+                            Show(artist, venue, now - timedelta(days=7))])
+        db.session.commit()
+        self.artist_id = artist.id
+        self.venue_id = venue.id
+        db.session.remove()
+
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+
+    def tearDown(self):
+        """Executed after reach test"""
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+        db.session.remove()
+        db.drop_all()
+
+    def record(self, conn, cursor, statement, parameters, context,
+               executemany):
+        self.statements.append(statement)
+
+    def test_venue_page_runs_one_query(self):
+        res = self.client().get('/venues/' + str(self.venue_id))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn(b'2 Upcoming Shows', res.data)
+        self.assertIn(b'1 Past Show', res.data)
+
+    def test_artist_page_runs_one_query(self):
+        res = self.client().get('/artists/' + str(self.artist_id))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn(b'2 Upcoming Shows', res.data)
+        self.assertIn(b'1 Past Show', res.data)
+
+    def test_venue_without_shows_has_no_shows(self):
+        venue = Venue(name="The Dueling Pianos Bar", city="New York",
+                      state="NY", genres=["Classical"])
+        db.session.add(venue)
+        db.session.commit()
+        res = self.client().get('/venues/' + str(venue.id))
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'0 Upcoming Shows', res.data)
+        self.assertIn(b'0 Past Shows', res.data)
+
+    def test_unknown_venue_is_not_found(self):
+        res = self.client().get('/venues/1000')
+        self.assertEqual(res.status_code, 404)
+
+    def test_shows_lists_upcoming_shows_by_default(self):
+        res = self.client().get('/shows')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data.count(b'tile-show'), 2)
+
+        res = self.client().get('/shows?past=1')
+        self.assertEqual(res.data.count(b'tile-show'), 3)
+
+    def test_shows_are_paginated_on_a_cursor(self):
+        artist = Artist.query.get(self.artist_id)
+        venue = Venue.query.get(self.venue_id)
+        now = datetime.utcnow()
+        db.session.add_all([Show(artist, venue, now + timedelta(hours=n))
+                            for n in range(1, SHOWS_PER_PAGE + 1)])
+        db.session.commit()
+
+        res = self.client().get('/shows')
+        self.assertEqual(res.data.count(b'tile-show'), SHOWS_PER_PAGE)
+        next_url = re.search(rb'href="([^"]*)">Next<', res.data)
+        self.assertIsNotNone(next_url)
+
+        next_url = next_url.group(1).decode().replace('&amp;', '&')
+        res = self.client().get(next_url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data.count(b'tile-show'), 2)
+        self.assertNotIn(b'>Next<', res.data)
+
+    def test_streamed_shows_match_rendered_shows(self):
+        res = self.client().get('/shows?past=1&stream=1')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data.count(b'tile-show'), 3)
+        # The rows are read after the header was sent
+        self.assertNotIn('db;', res.headers['Server-Timing'])
+
+    def test_datetime_filter_matches_babel(self):
+        value = datetime(2035, 4, 1, 20, 0)
+        for format, pattern in DATETIME_FORMATS.items():
+            self.assertEqual(format_datetime(value, format),
+                             babel.dates.format_datetime(value, pattern))
+        self.assertEqual(format_datetime('2035-04-01 20:00:00', 'full'),
+                         format_datetime(value, 'full'))
+
+    def test_venues_and_artists_are_filtered_by_genre(self):
+        res = self.client().get('/venues?genre=Jazz')
+        self.assertIn(b'Park Square Live Music', res.data)
+        res = self.client().get('/venues?genre=Classical')
+        self.assertNotIn(b'Park Square Live Music', res.data)
+
+        res = self.client().get('/artists?genre=Classical')
+        self.assertIn(b'The Wild Sax Band', res.data)
+        res = self.client().get('/artists?genre=Rock n Roll')
+        self.assertNotIn(b'The Wild Sax Band', res.data)
+
+    def import_lines(self, kind, suffix, lines, chunk_size=1000):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix) as source:
+            source.write('\n'.join(lines) + '\n')
+            source.flush()
+            return import_file(kind, source.name, chunk_size,
+                               out=io.StringIO())
+
+    def test_import_validates_and_inserts_in_chunks(self):
+        imported, rejected = self.import_lines('venues', '.csv', [
+            'name,city,state,address,phone,genres,seeking_talent',
+            'The Musical Hop,San Francisco,CA,1015 Folsom Street,'
+            '415-456-7890,"Jazz,Folk",True',
+            'Bad Phone,San Francisco,CA,1 Street,415-000-1234,Jazz,',
+            'No Address,San Francisco,CA,,415-456-7890,Jazz,',
+            'The Dueling Pianos Bar,New York,NY,335 Delancey Street,'
+            '914-456-7890,Classical,',
+        ], chunk_size=2)
+        self.assertEqual((imported, rejected), (2, 2))
+        venue = Venue.query.filter_by(name='The Musical Hop').one()
+        self.assertEqual(venue.genres, ['Jazz', 'Folk'])
+        self.assertTrue(venue.seeking_talent)
+        venue_id = venue.id
+
+        imported, rejected = self.import_lines('shows', '.jsonl', [
+            json.dumps({'venue_id': venue_id, 'artist_id': self.artist_id,
+                        'start_time': '2035-04-01 20:00:00'}),
+            json.dumps({'venue_id': 1000, 'artist_id': self.artist_id,
+                        'start_time': '2035-04-01 20:00:00'}),
+            json.dumps({'venue_id': venue_id, 'artist_id': self.artist_id,
+                        'start_time': 'tomorrow'}),
+            json.dumps({'venue_id': venue_id, 'artist_id': self.artist_id}),
+        ])
+        self.assertEqual((imported, rejected), (1, 3))
+        self.assertEqual(Show.query.filter_by(venue_id=venue_id).count(), 1)
+
+    def test_import_chunks_mix_empty_and_filled_optional_columns(self):
+        imported, rejected = self.import_lines('artists', '.csv', [
+            'name,city,state,phone,genres,seeking_venue,seeking_description',
+            'Guns N Petals,San Francisco,CA,415-456-7890,Rock n Roll,True,'
+            'Looking for shows',
+            'Matt Quevedo,New York,NY,914-456-7890,Jazz,,',
+        ])
+        self.assertEqual((imported, rejected), (2, 0))
+        petals = Artist.query.filter_by(name='Guns N Petals').one()
+        quevedo = Artist.query.filter_by(name='Matt Quevedo').one()
+        self.assertEqual((petals.seeking_venue, petals.seeking_description),
+                         (True, 'Looking for shows'))
+        self.assertEqual((quevedo.seeking_venue, quevedo.seeking_description),
+                         (False, None))
+
+    def test_synthetic_data_depends_only_on_the_seed(self):
+        now = datetime(2035, 4, 1)
+        first, second, other = (Generator(seed, now) for seed in (1, 1, 2))
+        for generator in (first, second, other):
+            generator.rows = [generator.venue(n) for n in range(10)] + \
+                [generator.artist(n) for n in range(10)] + \
+                list(generator.shows(50, range(1, 11), range(1, 11)))
+        self.assertEqual(first.rows, second.rows)
+        self.assertNotEqual(first.rows, other.rows)
+
+    def test_requests_report_their_queries(self):
+        res = self.client().get('/venues/' + str(self.venue_id))
+        self.assertRegex(res.headers['Server-Timing'],
+                         r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="1 query"$')
+
+        app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+        try:
+            with self.assertLogs(app.logger, 'WARNING') as logs:
+                self.client().get('/artists/' + str(self.artist_id))
+        finally:
+            app.config['SLOW_QUERY_THRESHOLD_MS'] = 100
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('in GET /artists/<int:artist_id>: SELECT',
+                      logs.output[0])
+
+    def test_pages_are_cached_until_a_write(self):
+        url = '/venues/' + str(self.venue_id)
+        first = self.client().get(url)
+        statements = len(self.statements)
+        second = self.client().get(url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(self.statements), statements)
+
+        res = self.client().delete(url)
+        self.assertEqual(res.status_code, 200)
+        res = self.client().get(url)
+        self.assertEqual(res.status_code, 404)
+
+    def test_rejected_show_keeps_the_cache(self):
+        self.client().get('/shows')
+        res = self.client().post('/shows/create', data={
+            'artist_id': self.artist_id, 'venue_id': self.venue_id * 100,
+            'start_time': '2035-04-01 20:00:00'})
+        self.assertEqual(res.status_code, 302)
+        statements = len(self.statements)
+        self.client().get('/shows')
+        self.assertEqual(len(self.statements), statements)
+
+    def test_cached_pages_expire(self):
+        now = [0]
+        backend = LRUBackend(maxsize=2, clock=lambda: now[0])
+        backend.set('/venues', 'venues', ttl=60)
+        backend.set('/artists', 'artists')
+        now[0] = 59
+        self.assertEqual(backend.get('/venues'), 'venues')
+        now[0] = 60
+        self.assertIsNone(backend.get('/venues'))
+        backend.set('/shows', 'shows')
+        backend.set('/venues/1', 'venue')
+        self.assertIsNone(backend.get('/artists'))
+
+    def test_pages_rendered_during_a_clear_are_not_cached(self):
+        backend = LRUBackend()
+        generation = backend.generation()
+        backend.clear()
+        backend.set('/artists', 'artists before the write', ttl=60,
+                    generation=generation)
+        self.assertIsNone(backend.get('/artists'))
+        backend.set('/artists', 'artists', ttl=60,
+                    generation=backend.generation())
+        self.assertEqual(backend.get('/artists'), 'artists')
+
+    def test_database_health_reports_the_pool(self):
+        res = self.client().get('/health/db')
+        self.assertEqual(res.status_code, 200)
+        data = res.get_json()
+        self.assertTrue(data['success'])
+        self.assertIn('pool', data)
+        self.assertIn('latency_ms', data)
+
+    def count_checkouts(self, request):
+        checkouts = []
+
+        def record(dbapi_connection, connection_record, connection_proxy):
+            checkouts.append(connection_record)
+
+        event.listen(db.engine.pool, 'checkout', record)
+        try:
+            res = request()
+        finally:
+            event.remove(db.engine.pool, 'checkout', record)
+        return res, len(checkouts)
+
+    def test_delete_runs_in_one_transaction(self):
+        url = '/venues/' + str(self.venue_id)
+        res, checkouts = self.count_checkouts(
+            lambda: self.client().delete(url))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(checkouts, 1)
+        # counted_at, upcoming shows of the venue, counter update, delete
+        self.assertLessEqual(len(self.statements), 4)
+        self.assertIsNone(Venue.query.get(self.venue_id))
+
+        res = self.client().delete(url)
+        self.assertEqual(res.status_code, 400)
+
+    def test_edit_runs_one_update(self):
+        res, checkouts = self.count_checkouts(lambda: self.client().post(
+            '/artists/' + str(self.artist_id) + '/edit', data={
+                'name': 'The Wild Sax Trio', 'city': 'San Francisco',
+                'state': 'CA', 'phone': '415-456-7890',
+                'genres': ['Jazz', 'Blues'], 'facebook_link': ''}))
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(checkouts, 1)
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(self.statements[0].startswith('UPDATE'))
+
+        artist = Artist.query.get(self.artist_id)
+        self.assertEqual(artist.name, 'The Wild Sax Trio')
+        self.assertEqual(artist.genres, ['Jazz', 'Blues'])
+
+        res = self.client().post('/artists/1000/edit', data={
+            'name': 'Nobody', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '415-456-7890', 'genres': ['Jazz']})
+        self.assertEqual(res.status_code, 404)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
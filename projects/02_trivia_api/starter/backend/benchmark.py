@@ -0,0 +1,122 @@
+'''
+Benchmarks for the trivia API endpoints.
+
+The benchmarks drop and recreate every table, so they must be pointed to a
+scratch database and never to the trivia or trivia_test ones:
+
+    createdb trivia_bench
+    DATABASE_URL=postgres:///trivia_bench python benchmark.py
+'''
+import json
+import os
+import sys
+import time
+
+from flaskr import create_app, QUESTIONS_PER_PAGE
+from models import db, Question, Category
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+              'Sports']
+CHUNK_SIZE = 10000
+
+
+def reset_db():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+
+def seed(questions):
+    db.session.execute(Category.__table__.insert(),
+                       [{'type': category} for category in CATEGORIES])
+    for start in range(0, questions, CHUNK_SIZE):
+        db.session.execute(Question.__table__.insert(), [{
+            'question': f'Question number {n}?',
+            'answer': f'Answer {n}',
+            'category': n % len(CATEGORIES) + 1,
+            'difficulty': n % 5 + 1}
+            for n in range(start, min(questions, start + CHUNK_SIZE))])
+    db.session.commit()
+
+
+def timed(label, function, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f'{label:<45} {elapsed * 1000:10.2f} ms')
+
+
+def load_all_and_slice(page):
+    # What GET /questions used to do before paginating in the database.
+    ques_entries = Question.query.all()
+    start = (page - 1) * QUESTIONS_PER_PAGE
+    return ques_entries[start:start + QUESTIONS_PER_PAGE]
+
+
+def bench_get_questions(client, questions):
+    last_page = questions // QUESTIONS_PER_PAGE
+    deep_id = Question.query.order_by(Question.id.desc())\
+        .offset(QUESTIONS_PER_PAGE).first().id
+
+    timed('load all and slice, page 1',
+          lambda: load_all_and_slice(1), repeat=1)
+    timed('GET /questions?page=1',
+          lambda: client.get('/questions?page=1'))
+    timed(f'GET /questions?page={last_page}',
+          lambda: client.get(f'/questions?page={last_page}'))
+    timed(f'GET /questions?after_id={deep_id}',
+          lambda: client.get(f'/questions?after_id={deep_id}'))
+
+
+def bench_search(client, questions):
+    term = str(questions // 2)
+    timed(f'POST /questions searchTerm={term}',
+          lambda: client.post('/questions',
+                              data=json.dumps({'searchTerm': term})))
+    timed('POST /questions searchTerm=question',
+          lambda: client.post('/questions',
+                              data=json.dumps({'searchTerm': 'question'})))
+
+
+def bench_batch(client, questions=1000):
+    new_questions = [{'question': f'Batch question {n}?', 'answer': 'Yes',
+                      'category': '1', 'difficulty': 1}
+                     for n in range(questions)]
+
+    def per_second(label, function):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        print(f'{label:<45} {questions / elapsed:10.0f} questions/s')
+
+    def added_ids():
+        return [id for id, in db.session.query(Question.id).filter(
+            Question.question.like('Batch question %'))]
+
+    per_second('POST /questions/new, one by one', lambda: [
+        client.post('/questions/new', data=json.dumps(question))
+        for question in new_questions])
+    per_second('DELETE /questions/<id>, one by one', lambda: [
+        client.delete(f'/questions/{id}') for id in added_ids()])
+    per_second('POST /questions/batch', lambda: client.post(
+        '/questions/batch', data=json.dumps({'questions': new_questions})))
+    per_second('DELETE /questions/batch', lambda: client.delete(
+        '/questions/batch', data=json.dumps({'ids': added_ids()})))
+
+
+if __name__ == '__main__':
+    if 'DATABASE_URL' not in os.environ:
+        sys.exit('Set DATABASE_URL to a scratch database. '
+                 'The benchmark drops all tables.')
+    questions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    app = create_app()
+    with app.app_context():
+        reset_db()
+        seed(questions)
+        print(f'{questions} questions')
+        client = app.test_client()
+        bench_get_questions(client, questions)
+        bench_search(client, questions)
+        bench_batch(client)
@@ -2,12 +2,18 @@ import os
 from flask import Flask, request, abort, jsonify, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
 from sqlalchemy import func
 
 import json
 
-from models import setup_db, Question, Category
+from models import setup_db, db, table_versions, Question, Category
+from fsnd_common.db_pool import add_health_route
+from .question_index import question_index
+from .category_cache import category_cache
+from .search import search_questions
+from fsnd_common.query_stats import QueryStats
+from .batch import BatchError, insert_questions, delete_questions, \
+    question_errors, question_row
 
 QUESTIONS_PER_PAGE = 10
 
@@ -15,7 +21,17 @@ QUESTIONS_PER_PAGE = 10
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    # Seconds after which cached categories are reloaded. Writes through
+    # this process always invalidate them, so no expiry is the default.
+    category_cache_ttl = os.environ.get('CATEGORY_CACHE_TTL')
+    app.config['CATEGORY_CACHE_TTL'] = \
+        float(category_cache_ttl) if category_cache_ttl else None
+    if test_config is not None:
+        app.config.from_mapping(test_config)
     setup_db(app)
+    QueryStats(app)
+    add_health_route(app, db)
+    category_cache.ttl = app.config['CATEGORY_CACHE_TTL']
 
     '''
   Set up CORS. Allow '*' for origins.
@@ -65,9 +81,9 @@ def create_app(test_config=None):
   Endpoint to handle GET requests for all available categories.
   '''
     @app.route('/categories')
+    @table_versions.conditional(Category)
     def get_categories():
-        categories = Category.query.order_by(Category.id).all()
-        category_types = [category.type.lower() for category in categories]
+        category_types = list(category_cache.types().values())
         return jsonify({
             "success": True,
             "categories": category_types
@@ -79,6 +95,11 @@ def create_app(test_config=None):
   This endpoint returns a list of questions,
   number of total questions, current category, categories.
 
+  Pages are read from the database with LIMIT/OFFSET, so only the
+  requested questions are loaded. Deep pages can be requested with
+  ?after_id=<id of the last question seen> instead of ?page=, which
+  seeks on the primary key instead of skipping over the offset rows.
+
   --TEST-- Possibly TOTO: At this point, when you start the application
   you should see questions and categories generated,
   ten questions per page and pagination at the bottom of the screen for three pages.
@@ -87,31 +108,37 @@ def create_app(test_config=None):
   '''
 
     @app.route('/questions', methods=['GET'])
+    @table_versions.conditional(Question, Category)
     def get_questions():
         page = request.args.get('page', 1, int)
+        after_id = request.args.get('after_id', None, int)
         # self TODO: The model should be changed to have a relationship to use
         # joins instead
-        ques_entries = Question.query.all()
-        total_questions = len(ques_entries)
-        if total_questions < (page - 1) * 10:
+        total_questions = Question.query.with_entities(
+            func.count(Question.id)).scalar()
+        if total_questions < (page - 1) * QUESTIONS_PER_PAGE:
             abort(400)
+
+        ques_query = Question.query.order_by(Question.id)
+        if after_id is not None:
+            ques_query = ques_query.filter(Question.id > after_id)
         else:
-            start = (page - 1) * 10
-            end = min(total_questions, start+10)
-            # Format only needed questions. Save resources.
-            formatted_ques = [question.format()
-                              for question in ques_entries[start:end]]
-            # Assume categories are expected to be page independent.
-            cat_entries = Category.query.all()
-            categories = {category.id: category.type.lower()
-                          for category in cat_entries}
-            return jsonify({
-                "success": True,
-                "questions": formatted_ques,
-                "totalQuestions": total_questions,
-                "categories": categories,
-                "currentCategory": "science"  # Decide what should this be.
-            })
+            ques_query = ques_query.offset((page - 1) * QUESTIONS_PER_PAGE)
+        ques_entries = ques_query.limit(QUESTIONS_PER_PAGE).all()
+
+        formatted_ques = [question.format() for question in ques_entries]
+        # Assume categories are expected to be page independent.
+        categories = category_cache.types()
+        return jsonify({
+            "success": True,
+            "questions": formatted_ques,
+            "totalQuestions": total_questions,
+            "categories": categories,
+            "currentCategory": "science",  # Decide what should this be.
+            # Cursor for the next page, None on the last one.
+            "nextAfterId": ques_entries[-1].id
+            if len(ques_entries) == QUESTIONS_PER_PAGE else None
+        })
 
     '''
   Endpoint to DELETE question using a question ID.
@@ -137,37 +164,87 @@ def create_app(test_config=None):
 
     @app.route('/questions/new', methods=['POST'])
     def add_new_question():
-        data = json.loads(request.data)
-        if data['question'] is ''\
-                or data['answer'] is ''\
-                or data['category'] is ''\
-                or data['difficulty'] is None:
+        data = request.get_json(force=True, silent=True)
+        errors = question_errors(data)
+        if errors:
             return jsonify({
-                "success": False
+                "success": False,
+                "errors": errors
             }), 400
 
-        question = Question(data['question'], data['answer'], data[
-                            'category'], data['difficulty'])
+        row = question_row(data)
+        question = Question(row['question'], row['answer'],
+                            row['category'], row['difficulty'])
         question.insert()
         return jsonify({
             "success": True
         })
 
+    '''
+  Batch endpoints, creating or deleting up to 1000 questions in one request
+  and one transaction. POST takes {"questions": [<question>, ...]} with the
+  same fields as /questions/new and returns the new ids (null on databases
+  which cannot return them). DELETE takes {"ids": [<id>, ...]}.
+  If any item is invalid nothing is written and the response is a 400 with
+  the errors of each invalid item and its index in the list.
+  '''
+    def batch_error(error):
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "errors": error.errors
+        }), 400
+
+    def batch_body(key):
+        # The list under key of a JSON object body, or None
+        data = request.get_json(force=True, silent=True)
+        return data.get(key) if isinstance(data, dict) else None
+
+    @app.route('/questions/batch', methods=['POST'])
+    def add_questions_batch():
+        questions = batch_body('questions')
+        try:
+            ids = insert_questions(questions)
+        except BatchError as error:
+            return batch_error(error)
+        return jsonify({
+            "success": True,
+            "created": len(questions),
+            "ids": ids
+        })
+
+    @app.route('/questions/batch', methods=['DELETE'])
+    def delete_questions_batch():
+        try:
+            deleted = delete_questions(batch_body('ids'))
+        except BatchError as error:
+            return batch_error(error)
+        return jsonify({
+            "success": True,
+            "deleted": deleted
+        })
+
     '''
   POST endpoint to get questions based on a search term.
-  It returns any questions for which the search term   is a substring of the question.
+  It returns any questions containing words starting with every word
+  of the search term, best matches first, one page at a time.
   '''
     @app.route('/questions', methods=['POST'])
     def search_question():
-        search_term = json.loads(request.data)['searchTerm']
-        pattern = '%{0}%'.format(search_term)
-        ques_entries = Question.query.filter(
-            Question.question.ilike(pattern)).order_by(Question.category).all()
+        params = json.loads(request.data)
+        try:
+            page = int(params.get('page', 1))
+        except (TypeError, ValueError):
+            abort(400)
+        if page < 1:
+            abort(400)
+        ques_entries, total_questions = search_questions(
+            params['searchTerm'], page, QUESTIONS_PER_PAGE)
         formatted_ques = [question.format() for question in ques_entries]
         return jsonify({
             "success": True,
             "questions": formatted_ques,
-            "totalQuestions": len(formatted_ques),
+            "totalQuestions": total_questions,
             "currentCategory": "art"
         })
 
@@ -176,17 +253,21 @@ def create_app(test_config=None):
   '''
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
     def get_questions_for_category(category_id):
-        ques_entries = Question.query.filter(
-            Question.category == str(category_id)).all()
+        # Questions found on the category index, with their category joined
+        ques_entries = db.session.query(Question, Category)\
+            .join(Category, Question.category == Category.id)\
+            .filter(Question.category == category_id)\
+            .order_by(Question.id).all()
         if not ques_entries:
             abort(404)
         else:
-            formatted_ques = [question.format() for question in ques_entries]
+            formatted_ques = [question.format()
+                              for question, _ in ques_entries]
             return jsonify({
                 "success": True,
                 "questions": formatted_ques,
                 "totalQuestions": len(formatted_ques),
-                "currentCategory": Category.query.get(category_id)
+                "currentCategory": ques_entries[0].Category.format()
             })
 
     '''
@@ -199,27 +280,23 @@ def create_app(test_config=None):
     @app.route('/quizzes', methods=['POST'])
     def start_quiz():
         params = json.loads(request.data)
-        previous_ques = params['previous_questions']
+        # Compared with the integer ids of the index, not by the database
+        try:
+            previous_ques = [int(id) for id in params['previous_questions']]
+        except (TypeError, ValueError):
+            abort(400)
 
         # WARNING: VERY VERY UGLY HACKS.
         # DIDN'T HAVE THE PATIENCE TO FIX FRONTEND SENDING WRONG IDS
         # Front end should be fixed for this.
         if params['quiz_category']['type'] == 'click':  # don't know how
-            new_questions = Question.query
+            category = None
         else:
-            category = str(int(params['quiz_category']['id']) + 1)
-           # This can be cached
-            new_questions = Question.query.filter(
-                Question.category == category)
+            category = int(params['quiz_category']['id']) + 1
 
-        if len(previous_ques) != 0:
-            new_questions = new_questions.filter(
-                ~Question.id.in_(previous_ques))
-
-        if new_questions.count() == 0:
-            question = None
-        else:
-            question = random.choice(new_questions.all())
+        # Drawn from the in-memory id index, so neither the candidates nor
+        # the previous questions are sent to the database.
+        question = question_index.random_question(category, previous_ques)
 
         return jsonify({
             "success": True,
@@ -0,0 +1,150 @@
+from models import db, Question
+from .category_cache import category_cache
+from fsnd_common.etag import changed_tables
+from .question_index import question_index
+from .search import inverted_index
+
+'''
+Batch writes of questions
+
+Every question of a batch is validated before anything is written, and the
+batch is written by a single statement in a single transaction: either all
+questions are created or deleted, or none is and the errors are reported
+with the position of the question they are about.
+
+Bulk statements bypass the mapper events which keep the question index, the
+search index and the ETag versions up to date, so they are updated here.
+'''
+
+MAX_BATCH_SIZE = 1000
+
+
+class BatchError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def question_errors(item):
+    # Also used by POST /questions/new, so that both accept the same
+    # questions
+    if not isinstance(item, dict):
+        return ['must be an object']
+    errors = []
+    if not isinstance(item.get('question'), str) or \
+            not item['question'].strip():
+        errors.append('question is required')
+    answer = item.get('answer')
+    if not (isinstance(answer, str) and answer.strip() or is_number(answer)):
+        errors.append('answer is required')
+    try:
+        if int(item.get('category')) not in category_cache.all():
+            errors.append('category does not exist')
+    except (TypeError, ValueError):
+        errors.append('category must be a category id')
+    difficulty = item.get('difficulty')
+    if not (isinstance(difficulty, int) and not isinstance(difficulty, bool)
+            or isinstance(difficulty, str) and difficulty.strip().isdigit()):
+        errors.append('difficulty must be a number')
+    return errors
+
+
+def question_row(item):
+    # Column values of a question which passed question_errors
+    return {'question': item['question'],
+            'answer': str(item['answer']),
+            'category': int(item['category']),
+            'difficulty': int(item['difficulty'])}
+
+
+def check_batch(items, item_errors):
+    if not isinstance(items, list) or not items:
+        raise BatchError([{'index': None,
+                           'errors': ['expected a list of items']}])
+    if len(items) > MAX_BATCH_SIZE:
+        raise BatchError([{'index': None, 'errors': [
+            f'at most {MAX_BATCH_SIZE} items per batch']}])
+    errors = [{'index': index, 'errors': messages}
+              for index, messages in enumerate(map(item_errors, items))
+              if messages]
+    if errors:
+        raise BatchError(errors)
+
+
+def insert_questions(items):
+    check_batch(items, question_errors)
+    rows = [question_row(item) for item in items]
+    table = Question.__table__
+
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            # One multi-row INSERT, which also returns the new ids
+            ids = [id for id, in db.session.execute(
+                table.insert().values(rows).returning(table.c.id))]
+        else:
+            # One executemany, the ids are not returned
+            db.session.execute(table.insert(), rows)
+            ids = None
+        changed_tables(db.session).add(table.name)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if ids is None:
+        question_index.invalidate()
+        inverted_index.invalidate()
+    else:
+        for id, row in zip(ids, rows):
+            question_index.add(id, row['category'])
+            inverted_index.add(id, row['question'])
+    return ids
+
+
+def id_errors(id):
+    if not isinstance(id, int) or isinstance(id, bool):
+        return ['must be a question id']
+    return []
+
+
+def duplicate_errors(ids):
+    # Each id is deleted once, so that the count answers the request
+    first = {}
+    errors = []
+    for index, id in enumerate(ids):
+        if id in first:
+            errors.append({'index': index,
+                           'errors': [f'duplicate of item {first[id]}']})
+        else:
+            first[id] = index
+    return errors
+
+
+def delete_questions(ids):
+    check_batch(ids, id_errors)
+    errors = duplicate_errors(ids)
+    if errors:
+        raise BatchError(errors)
+    try:
+        # Locks the questions, so that they still exist when deleted
+        existing = {id for id, in db.session.query(Question.id)
+                    .filter(Question.id.in_(ids)).with_for_update()}
+        errors = [{'index': index, 'errors': ['question does not exist']}
+                  for index, id in enumerate(ids) if id not in existing]
+        if errors:
+            raise BatchError(errors)
+
+        Question.query.filter(Question.id.in_(existing))\
+            .delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for id in existing:
+        question_index.remove(id)
+        inverted_index.remove(id)
+    return len(existing)
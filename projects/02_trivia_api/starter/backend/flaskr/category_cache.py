@@ -0,0 +1,64 @@
+import threading
+import time
+
+from sqlalchemy import event
+
+from models import Category, table_versions
+
+'''
+CategoryCache
+Process-wide copy of the categories table, shared by every endpoint that
+needs the id to type map.
+
+The categories are loaded once and kept until a Category is written in this
+process, the categories version in table_versions changes, e.g. after a
+write by another process, or, if a ttl is given, until it expires.
+'''
+
+
+class CategoryCache:
+    def __init__(self, ttl=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._categories = None
+        self._loaded_at = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _expired(self):
+        return self.ttl is not None and \
+            self.clock() - self._loaded_at >= self.ttl
+
+    def all(self):
+        # Read along with the ETag of conditional requests, so usually free
+        version = table_versions.version(Category.__tablename__)
+        with self._lock:
+            if self._categories is None or self._version != version or \
+                    self._expired():
+                self._categories = {
+                    category.id: category.format() for category in
+                    Category.query.order_by(Category.id).all()}
+                self._loaded_at = self.clock()
+                self._version = version
+            return self._categories
+
+    def get(self, category_id):
+        return self.all().get(category_id)
+
+    def types(self):
+        return {id: category['type'].lower()
+                for id, category in self.all().items()}
+
+    def invalidate(self):
+        with self._lock:
+            self._categories = None
+
+
+category_cache = CategoryCache()
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def invalidate_category_cache(mapper, connection, category):
+    category_cache.invalidate()
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+
+from sqlalchemy import event
+
+from models import db, Question
+
+'''
+QuestionIndex
+Ids of all questions, grouped per category and held in memory, so a quiz
+question can be drawn at random without loading every candidate from the
+database.
+
+The index is loaded lazily, updated when questions are inserted or deleted
+in this process and reloaded after ttl seconds to pick up writes made by
+other processes. Ids that turn out to be stale are dropped when drawn.
+'''
+
+
+def category_key(category):
+    # Ids are kept as integers, whether the category comes from a request,
+    # the integer column or a database created when it held text.
+    try:
+        return int(category)
+    except (TypeError, ValueError):
+        return category
+
+
+class IdSet:
+    '''
+    List of ids with a position lookup,
+    for O(1) add, remove and random choice.
+    '''
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, id):
+        if id not in self.positions:
+            self.positions[id] = len(self.ids)
+            self.ids.append(id)
+
+    def remove(self, id):
+        position = self.positions.pop(id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if last != id:
+            self.ids[position] = last
+            self.positions[last] = position
+
+
+class QuestionIndex:
+    # Below this share of excluded questions, draw and retry.
+    # Above it, filter the candidates once.
+    REJECTION_SAMPLING_LIMIT = 0.5
+
+    def __init__(self, ttl=60, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._all = None
+        self._by_category = None
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        all_ids, by_category = IdSet(), {}
+        for id, category in db.session.query(Question.id, Question.category):
+            all_ids.add(id)
+            by_category.setdefault(category_key(category), IdSet()).add(id)
+        self._all, self._by_category = all_ids, by_category
+        self._loaded_at = self.clock()
+
+    def _ids(self, category):
+        with self._lock:
+            if self._all is None or self.clock() - self._loaded_at >= self.ttl:
+                self._load()
+            if category is None:
+                return self._all
+            return self._by_category.get(category_key(category), IdSet())
+
+    def invalidate(self):
+        with self._lock:
+            self._all = self._by_category = None
+
+    def add(self, id, category):
+        with self._lock:
+            if self._all is not None:
+                self._all.add(id)
+                self._by_category.setdefault(category_key(category),
+                                             IdSet()).add(id)
+
+    def remove(self, id, category=None):
+        with self._lock:
+            if self._all is not None:
+                self._all.remove(id)
+                if category is not None:
+                    categories = [self._by_category.get(
+                        category_key(category), IdSet())]
+                else:
+                    categories = self._by_category.values()
+                for ids in categories:
+                    ids.remove(id)
+
+    def random_id(self, category=None, exclude=()):
+        exclude = set(exclude)
+        with self._lock:
+            ids = self._ids(category)
+            if len(ids) == 0:
+                return None
+            if len(exclude) < len(ids) * self.REJECTION_SAMPLING_LIMIT:
+                # Expected number of draws is below 1 / (1 - limit).
+                while True:
+                    id = random.choice(ids.ids)
+                    if id not in exclude:
+                        return id
+            candidates = [id for id in ids.ids if id not in exclude]
+        return random.choice(candidates) if candidates else None
+
+    def random_question(self, category=None, exclude=()):
+        while True:
+            id = self.random_id(category, exclude)
+            if id is None:
+                return None
+            question = Question.query.get(id)
+            if question is not None and (
+                    category is None or
+                    category_key(question.category) == category_key(category)):
+                return question
+            # Deleted or moved by another process since the index was loaded.
+            self.remove(id)
+            if question is not None:
+                self.add(question.id, question.category)
+
+
+question_index = QuestionIndex()
+
+
+@event.listens_for(Question, 'after_insert')
+def add_to_question_index(mapper, connection, question):
+    question_index.add(question.id, question.category)
+
+
+@event.listens_for(Question, 'after_delete')
+def remove_from_question_index(mapper, connection, question):
+    question_index.remove(question.id, question.category)
+
+
+@event.listens_for(Question, 'after_update')
+def update_question_index(mapper, connection, question):
+    question_index.remove(question.id)
+    question_index.add(question.id, question.category)
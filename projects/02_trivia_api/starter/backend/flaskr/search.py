@@ -0,0 +1,181 @@
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import DDL, event, func, literal_column
+
+from models import db, Question
+
+'''
+Question search
+
+On PostgreSQL, questions are matched against a tsvector column kept up to
+date by a trigger and indexed with GIN. db.create_all() creates the column,
+index and trigger along with the questions table, databases restored from
+trivia.psql get them from migrations/question_search.sql. Searching only
+reads them.
+
+On other databases (SQLite test runs), an in-memory inverted index is used
+instead.
+
+Both backends match every word of the search term as a prefix, rank the
+questions by relevance and return one page of results with the total number
+of matches.
+'''
+
+WORD = re.compile(r'\w+')
+
+# Run by create_all() after creating the questions table, see also
+# migrations/question_search.sql
+SEARCH_SCHEMA = [
+    'ALTER TABLE questions ADD COLUMN search_vector tsvector',
+    'CREATE INDEX questions_search_vector_idx '
+    'ON questions USING GIN (search_vector)',
+    'CREATE TRIGGER questions_search_vector_update '
+    'BEFORE INSERT OR UPDATE OF question ON questions '
+    'FOR EACH ROW EXECUTE PROCEDURE '
+    "tsvector_update_trigger(search_vector, 'pg_catalog.english', question)",
+]
+
+for statement in SEARCH_SCHEMA:
+    event.listen(Question.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+
+
+def tokenize(text):
+    return WORD.findall(text.lower()) if text else []
+
+
+def all_questions(page, per_page):
+    # An empty search term matches every question.
+    query = Question.query.order_by(Question.id)
+    total = query.order_by(None).with_entities(func.count(Question.id))\
+        .scalar()
+    return query.limit(per_page).offset((page - 1) * per_page).all(), total
+
+
+class PostgresSearch:
+    def search(self, term, page, per_page):
+        words = tokenize(term)
+        if not words:
+            return all_questions(page, per_page)
+
+        vector = literal_column('questions.search_vector')
+        ts_query = func.to_tsquery(
+            'pg_catalog.english', ' & '.join(w + ':*' for w in words))
+        query = Question.query.filter(vector.op('@@')(ts_query))\
+            .order_by(func.ts_rank(vector, ts_query).desc(), Question.id)
+
+        total = query.order_by(None).with_entities(
+            func.count(Question.id)).scalar()
+        questions = query.limit(per_page).offset((page - 1) * per_page).all()
+        return questions, total
+
+
+class InvertedIndexSearch:
+    def __init__(self, ttl=60, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._postings = None
+        self._words = None
+        self._vocabulary = None
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        self._postings = defaultdict(dict)
+        self._words = {}
+        self._vocabulary = None
+        for id, question in db.session.query(Question.id, Question.question):
+            self._add(id, question)
+        self._loaded_at = self.clock()
+
+    def _add(self, id, question):
+        words = tokenize(question)
+        for word in words:
+            postings = self._postings[word]
+            postings[id] = postings.get(id, 0) + 1
+        self._words[id] = set(words)
+        self._vocabulary = None
+
+    def _remove(self, id):
+        for word in self._words.pop(id, ()):
+            del self._postings[word][id]
+            if not self._postings[word]:
+                del self._postings[word]
+        self._vocabulary = None
+
+    def add(self, id, question):
+        with self._lock:
+            if self._postings is not None:
+                self._remove(id)
+                self._add(id, question)
+
+    def remove(self, id):
+        with self._lock:
+            if self._postings is not None:
+                self._remove(id)
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+
+    def _scores(self, words):
+        if self._postings is None or \
+                self.clock() - self._loaded_at >= self.ttl:
+            self._load()
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+
+        scores = None
+        for word in words:
+            matches = defaultdict(int)
+            start = bisect.bisect_left(self._vocabulary, word)
+            for vocable in self._vocabulary[start:]:
+                if not vocable.startswith(word):
+                    break
+                for id, count in self._postings[vocable].items():
+                    matches[id] += count
+            if scores is None:
+                scores = matches
+            else:
+                scores = {id: score + matches[id]
+                          for id, score in scores.items() if id in matches}
+        return scores
+
+    def search(self, term, page, per_page):
+        words = tokenize(term)
+        if not words:
+            return all_questions(page, per_page)
+
+        with self._lock:
+            scores = self._scores(words)
+        ranked = sorted(scores, key=lambda id: (-scores[id], id))
+        page_ids = ranked[(page - 1) * per_page:page * per_page]
+        questions = {question.id: question for question in
+                     Question.query.filter(Question.id.in_(page_ids)).all()}
+        return [questions[id] for id in page_ids if id in questions],\
+            len(ranked)
+
+
+postgres_search = PostgresSearch()
+inverted_index = InvertedIndexSearch()
+
+
+def search_questions(term, page=1, per_page=10):
+    if db.engine.dialect.name == 'postgresql':
+        return postgres_search.search(term, page, per_page)
+    return inverted_index.search(term, page, per_page)
+
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+def add_to_inverted_index(mapper, connection, question):
+    inverted_index.add(question.id, question.question)
+
+
+@event.listens_for(Question, 'after_delete')
+def remove_from_inverted_index(mapper, connection, question):
+    inverted_index.remove(question.id)
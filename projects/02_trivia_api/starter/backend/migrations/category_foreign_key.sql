@@ -0,0 +1,35 @@
+--
+-- Makes questions.category an indexed integer foreign key to categories.id.
+--
+-- Databases created by db.create_all() before this change hold the category
+-- id as text, and the ones restored from an older trivia.psql lack the
+-- index. Run once on either, it does nothing on an up to date database:
+--
+--     psql trivia < migrations/category_foreign_key.sql
+--
+
+BEGIN;
+
+-- Text ids become integers, empty ones NULL
+ALTER TABLE public.questions
+    ALTER COLUMN category TYPE integer
+    USING NULLIF(trim(category::text), '')::integer;
+
+-- Questions of categories which no longer exist lose their category, like
+-- the ON DELETE SET NULL of the constraint would have done
+UPDATE public.questions SET category = NULL
+    WHERE category IS NOT NULL
+    AND category NOT IN (SELECT id FROM public.categories);
+
+ALTER TABLE public.questions DROP CONSTRAINT IF EXISTS category;
+ALTER TABLE public.questions DROP CONSTRAINT IF EXISTS questions_category_fkey;
+ALTER TABLE public.questions
+    ADD CONSTRAINT questions_category_fkey FOREIGN KEY (category)
+    REFERENCES public.categories(id) ON UPDATE CASCADE ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_questions_category
+    ON public.questions USING btree (category);
+
+ANALYZE public.questions;
+
+COMMIT;
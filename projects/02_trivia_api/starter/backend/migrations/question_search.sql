@@ -0,0 +1,33 @@
+--
+-- Adds the full-text search column of questions, kept up to date by a
+-- trigger and indexed with GIN, and fills it for the existing questions.
+--
+-- db.create_all() creates them along with the questions table, restored or
+-- older databases need this script. Run once on either, it does nothing on
+-- an up to date database:
+--
+--     psql trivia < migrations/question_search.sql
+--
+
+BEGIN;
+
+ALTER TABLE public.questions
+    ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE INDEX IF NOT EXISTS questions_search_vector_idx
+    ON public.questions USING gin (search_vector);
+
+DROP TRIGGER IF EXISTS questions_search_vector_update ON public.questions;
+CREATE TRIGGER questions_search_vector_update
+    BEFORE INSERT OR UPDATE OF question ON public.questions
+    FOR EACH ROW EXECUTE PROCEDURE
+    tsvector_update_trigger(search_vector, 'pg_catalog.english', question);
+
+UPDATE public.questions
+    SET search_vector = to_tsvector('pg_catalog.english',
+                                    coalesce(question, ''))
+    WHERE search_vector IS NULL;
+
+ANALYZE public.questions;
+
+COMMIT;
@@ -1,13 +1,19 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, ForeignKey, create_engine
 from flask_sqlalchemy import SQLAlchemy
 import json
 from dataclasses import dataclass
 
+from fsnd_common.db_pool import engine_options
+from fsnd_common.etag import TableVersions
+
 database_name = "trivia"
-database_path = "postgres:///{}".format(database_name)
+database_path = os.environ.get(
+    "DATABASE_URL", "postgres:///{}".format(database_name))
 
 db = SQLAlchemy()
+# Versions of the tables, which the ETags of conditional GETs are made of
+table_versions = TableVersions(db)
 
 '''
 setup_db(app)
@@ -18,6 +24,7 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -40,7 +47,10 @@ class Question(db.Model):
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    # Indexed, so that the questions of a category are an index lookup
+    category = Column(Integer, ForeignKey('categories.id',
+                                          onupdate='CASCADE',
+                                          ondelete='SET NULL'), index=True)
     difficulty = Column(Integer)
 
     def __init__(self, question, answer, category, difficulty):
@@ -4,7 +4,8 @@ import json
 from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr.category_cache import category_cache
+from models import setup_db, db, Question, Category
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -62,6 +63,31 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(len(data_incomplete_page['questions']), count-10)
         pass
 
+    def test_after_id_continues_from_previous_page(self):
+        res_1 = self.client().get('/questions')
+        data_page_1 = json.loads(res_1.data)
+        self.assert_valid_request(res_1, data_page_1)
+
+        res_2 = self.client().get(
+            '/questions?after_id=' + str(data_page_1['nextAfterId']))
+        data_after_id = json.loads(res_2.data)
+        data_page_2 = json.loads(self.client().get('/questions?page=2').data)
+        self.assert_valid_request(res_2, data_after_id)
+        self.assertEqual(data_after_id['questions'], data_page_2['questions'])
+        pass
+
+    def test_search_matches_words_of_questions(self):
+        word = max(Question.query.first().question.split(), key=len)
+        word = word.strip('?!.,\'"').lower()
+        res = self.client().post('/questions', data=json.dumps(
+            {'searchTerm': word[:4]}))
+        data = json.loads(res.data)
+        self.assert_valid_request(res, data)
+        self.assertGreaterEqual(data['totalQuestions'], 1)
+        for question in data['questions']:
+            self.assertIn(word[:4], question['question'].lower())
+        pass
+
     def test_categories_returns_all(self):
         res = self.client().get('/categories')
         data = json.loads(res.data)
@@ -69,6 +95,90 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(len(data['categories']), 6)
         pass
 
+    def test_category_writes_invalidate_cached_categories(self):
+        self.client().get('/categories')
+        category = Category('Music')
+        db.session.add(category)
+        db.session.commit()
+        try:
+            res = self.client().get('/categories')
+            data = json.loads(res.data)
+            self.assert_valid_request(res, data)
+            self.assertIn('music', data['categories'])
+        finally:
+            db.session.delete(category)
+            db.session.commit()
+
+        data = json.loads(self.client().get('/categories').data)
+        self.assertNotIn('music', data['categories'])
+        pass
+
+    def test_category_cache_ttl_is_configurable(self):
+        create_app({'CATEGORY_CACHE_TTL': 30})
+        self.assertEqual(category_cache.ttl, 30)
+        create_app()
+        self.assertIsNone(category_cache.ttl)
+        pass
+
+    def test_unchanged_questions_are_not_sent_again(self):
+        res = self.client().get('/questions?page=1')
+        etag = res.headers['ETag']
+        res = self.client().get('/questions?page=1',
+                                headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+        res = self.client().get('/questions?page=2',
+                                headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+
+        question = Question('?', '42', '1', 5)
+        question.insert()
+        question.delete()
+        res = self.client().get('/questions?page=1',
+                                headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        pass
+
+    def test_questions_written_elsewhere_are_sent_again(self):
+        # e.g. by another worker, or from psql
+        etag = self.client().get('/questions').headers['ETag']
+        db.session.execute("UPDATE table_versions SET version = version + 1 "
+                           "WHERE name = 'questions'")
+        db.session.commit()
+        res = self.client().get('/questions',
+                                headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        pass
+
+    def test_categories_written_elsewhere_are_sent_again(self):
+        self.client().get('/categories')
+        # Inserted without the ORM, so the cache of this process is only
+        # told by the version
+        db.session.execute("INSERT INTO categories (type) VALUES ('Music')")
+        db.session.execute("UPDATE table_versions SET version = version + 1 "
+                           "WHERE name = 'categories'")
+        db.session.commit()
+        try:
+            data = json.loads(self.client().get('/categories').data)
+            self.assertIn('music', data['categories'])
+        finally:
+            db.session.execute("DELETE FROM categories WHERE type = 'Music'")
+            db.session.execute("UPDATE table_versions "
+                               "SET version = version + 1 "
+                               "WHERE name = 'categories'")
+            db.session.commit()
+        pass
+
+    def test_search_with_invalid_page_bad_request(self):
+        for page in ('two', 0):
+            res = self.client().post('/questions', data=json.dumps(
+                {'searchTerm': 'title', 'page': page}))
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(json.loads(res.data)['success'], False)
+        pass
+
     def test_invalid_category_id_bad_request(self):
         res = self.client().get('/categories/100/questions')
         self.assertEqual(res.status_code, 404)
@@ -88,6 +198,46 @@ class TriviaTestCase(unittest.TestCase):
                 id, Question.query.filter_by(category=id).count())
         pass
 
+    def test_quiz_returns_an_unplayed_question_of_the_category(self):
+        questions = Question.query.filter_by(category=1).all()
+        played = [question.id for question in questions[1:]]
+        res = self.client().post('/quizzes', data=json.dumps(
+            {'previous_questions': played,
+             'quiz_category': {'type': 'Science', 'id': 0}}))
+        data = json.loads(res.data)
+        self.assert_valid_request(res, data)
+        question = Question.query.get(data['question']['id'])
+        self.assertEqual(question.category, 1)
+        self.assertNotIn(question.id, played)
+        pass
+
+    def test_quiz_skips_played_questions_sent_as_text(self):
+        played = [str(question.id) for question in
+                  Question.query.filter_by(category=1).all()]
+        res = self.client().post('/quizzes', data=json.dumps(
+            {'previous_questions': played,
+             'quiz_category': {'type': 'Science', 'id': 0}}))
+        data = json.loads(res.data)
+        self.assert_valid_request(res, data)
+        self.assertIsNone(data['question'])
+
+        res = self.client().post('/quizzes', data=json.dumps(
+            {'previous_questions': ['first'],
+             'quiz_category': {'type': 'Science', 'id': 0}}))
+        self.assertEqual(res.status_code, 400)
+        pass
+
+    def test_quiz_returns_none_when_all_questions_were_played(self):
+        played = [question.id for question in
+                  Question.query.filter_by(category=1).all()]
+        res = self.client().post('/quizzes', data=json.dumps(
+            {'previous_questions': played,
+             'quiz_category': {'type': 'Science', 'id': 0}}))
+        data = json.loads(res.data)
+        self.assert_valid_request(res, data)
+        self.assertIsNone(data['question'])
+        pass
+
     def test_adding_question_increases_total_count(self):
         inital_count = Question.query.count()
         res = self.client().post('/questions/new', data=json.dumps(
@@ -97,6 +247,17 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(inital_count+1, later_count)
         pass
 
+    def test_adding_question_to_unknown_category_bad_request(self):
+        inital_count = Question.query.count()
+        for category in ('science', 1000):
+            res = self.client().post('/questions/new', data=json.dumps(
+                {'question': "?", 'answer': '42', 'category': category,
+                 'difficulty': 5}))
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(json.loads(res.data)['success'], False)
+        self.assertEqual(Question.query.count(), inital_count)
+        pass
+
     def test_deleteing_question_decreases_total_count(self):
         inital_count = Question.query.count()
         res = self.client().delete('/questions/' + str(Question.query.first().id))
@@ -105,6 +266,51 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(inital_count-1, later_count)
         pass
 
+    def test_batch_creates_and_deletes_questions(self):
+        inital_count = Question.query.count()
+        res = self.client().post('/questions/batch', data=json.dumps(
+            {'questions': [{'question': 'Batch question %d?' % n,
+                            'answer': '', 'category': '1',
+                            'difficulty': 5} for n in range(3)]}))
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([error['index'] for error in
+                          json.loads(res.data)['errors']], [0, 1, 2])
+        self.assertEqual(Question.query.count(), inital_count)
+
+        for body in ([], 'questions', None):
+            res = self.client().post('/questions/batch',
+                                     data=json.dumps(body))
+            self.assertEqual(res.status_code, 400)
+            res = self.client().delete('/questions/batch',
+                                       data=json.dumps(body))
+            self.assertEqual(res.status_code, 400)
+
+        res = self.client().post('/questions/batch', data=json.dumps(
+            {'questions': [{'question': 'Batch question %d?' % n,
+                            'answer': 42, 'category': '1',
+                            'difficulty': 5} for n in range(3)]}))
+        data = json.loads(res.data)
+        self.assert_valid_request(res, data)
+        self.assertEqual(len(data['ids']), 3)
+        self.assertEqual(Question.query.count(), inital_count + 3)
+
+        res = self.client().delete('/questions/batch', data=json.dumps(
+            {'ids': data['ids'] + [data['ids'][-1] * 100]}))
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(json.loads(res.data)['errors'][0]['index'], 3)
+
+        res = self.client().delete('/questions/batch', data=json.dumps(
+            {'ids': data['ids'] + [data['ids'][0]]}))
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(json.loads(res.data)['errors'], [
+            {'index': 3, 'errors': ['duplicate of item 0']}])
+
+        res = self.client().delete('/questions/batch', data=json.dumps(
+            {'ids': data['ids']}))
+        self.assert_valid_request(res, json.loads(res.data))
+        self.assertEqual(Question.query.count(), inital_count)
+        pass
+
     def test_deleteing_invalid_question_gives_400(self):
         res = self.client().delete('/questions/' + str(Question.query.first().id*100))
         self.assertEqual(res.status_code, 400)
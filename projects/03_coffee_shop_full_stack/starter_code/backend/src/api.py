@@ -4,11 +4,16 @@ from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
-from .auth.auth import AuthError, requires_auth
+from .database.models import db_drop_and_create_all, setup_db, db, \
+    table_versions, Drink
+from fsnd_common.db_pool import add_health_route
+from .auth.auth import AuthError, requires_auth, token_cache
+from fsnd_common.query_stats import QueryStats
 
 app = Flask(__name__)
 setup_db(app)
+QueryStats(app)
+add_health_route(app, db)
 CORS(app)
 
 '''
@@ -27,15 +32,51 @@ db_drop_and_create_all()
 '''
 
 
+# Drinks are listed by pages of ?limit= drinks, 50 by default and at most
+# 500, in id order. ?after=<id> starts the page after that drink, the
+# next_after field of a page gives the cursor of the next one (null on the
+# last page).
+DRINKS_PER_PAGE = 50
+MAX_DRINKS_PER_PAGE = 500
+
+
+def drink_json(row):
+    # The recipe is read as JSON text, only id and title are encoded
+    return '{"id": %d, "title": %s, "recipe": %s}' % (
+        row.id, json.dumps(row.title), row.recipe)
+
+
+def stream_drinks(rows, limit):
+    # Writes the drinks array as the rows come from the database
+    yield '{"success": true, "drinks": ['
+    last_id = next_after = None
+    for count, row in enumerate(rows):
+        # The query reads one more row than the page, if it is there the
+        # page is not the last one
+        if count == limit:
+            next_after = last_id
+            break
+        yield (', ' if count else '') + drink_json(row)
+        last_id = row.id
+    yield '], "next_after": %s}' % json.dumps(next_after)
+
+
+def drinks_page(detail):
+    after = request.args.get('after', None, int)
+    limit = request.args.get('limit', DRINKS_PER_PAGE, int)
+    if limit < 1 or limit > MAX_DRINKS_PER_PAGE:
+        abort(422)
+    # Read before the response is returned, so that the query is counted in
+    # its Server-Timing header, only the encoding is streamed
+    rows = Drink.rows(detail, after, limit + 1).all()
+    return app.response_class(stream_drinks(rows, limit),
+                              mimetype='application/json')
+
+
 @app.route('/drinks')
+@table_versions.conditional(Drink)
 def get_drinks_short():
-    try:
-        drinks = [description.short() for description in Drink.query.all()]
-        print("number of drinks: ", len(drinks))
-        return jsonify({"success": True, "drinks": drinks}), 200
-    except Exception as e:
-        print(e)
-        abort(422)
+    return drinks_page(detail=False), 200
 
 
 '''
@@ -46,13 +87,7 @@ def get_drinks_short():
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
 def get_drinks_dertailed(something):
-    try:
-        drinks = [description.long() for description in Drink.query.all()]
-        print("number of drinks: ", len(drinks))
-        return jsonify({"success": True, "drinks": drinks}), 200
-    except Exception as e:
-        print(e)
-        abort(422)
+    return drinks_page(detail=True), 200
 
 
 '''
@@ -65,9 +100,9 @@ def get_drinks_dertailed(something):
 def add_new_drink(something):
     data = json.loads(request.data)
     try:
-        new_drink = Drink(data['title'], str(json.dumps(data['recipe'])))
+        new_drink = Drink(data['title'], data['recipe'])
         new_drink.insert()
-        return jsonify({'success': True, "drink": [json.dumps(new_drink.long())]}), 200
+        return jsonify({'success': True, "drink": [new_drink.long()]}), 200
     except Exception as e:
         print(e)
         abort(422)
@@ -89,10 +124,10 @@ def patch_drink(something, drink_id):
         data_dict = json.loads(request.data)
         if "title" in data_dict:
             # print("found patch for title")
-            data.title = json.dumps(data_dict['title'])
+            data.title = data_dict['title']
         if "recipe" in data_dict:
             # print("found patch for recipe")
-            data.recipe = json.dumps(data_dict['recipe'])
+            data.recipe = data_dict['recipe']
         data.update()
         return jsonify({"success": True, "drinks": [data.long()]}), 200
     except Exception as e:
@@ -120,6 +155,18 @@ def remove_drink(something, drink_id):
         abort(422)
 
 
+'''
+    GET /health/auth
+        size and hit and miss counters of the verified token cache, for
+        monitoring
+'''
+
+
+@app.route('/health/auth')
+def auth_health():
+    return jsonify({"success": True, "token_cache": token_cache.stats()})
+
+
 # Error Handling
 
 @app.errorhandler(422)
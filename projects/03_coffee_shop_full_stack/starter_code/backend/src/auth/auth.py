@@ -1,14 +1,41 @@
-import json
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from .jwks import JWKSCache, url_fetcher
+from .token_cache import VerifiedTokenCache
 
 
 AUTH0_DOMAIN = 'udacity-fsnd.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'dev'
 
+# JWKS Cache
+'''
+Signing keys are fetched once and reused until JWKS_TTL expires,
+instead of downloading the key set on every authenticated request.
+Use jwks_cache.fetcher = file_fetcher(path) to verify against local keys.
+'''
+JWKS_TTL = 600
+JWKS_MIN_REFRESH_INTERVAL = 30
+
+jwks_cache = JWKSCache(
+    url_fetcher(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'),
+    ttl=JWKS_TTL,
+    min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL)
+
+# Verified Token Cache
+'''
+Payloads of tokens that already passed verification, served until the
+token expires. token_cache.stats() reports the hit and miss counters,
+served by GET /health/auth.
+'''
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_MAX_AGE = 300
+
+token_cache = VerifiedTokenCache(max_size=TOKEN_CACHE_SIZE,
+                                 max_age=TOKEN_CACHE_MAX_AGE)
+
 # AuthError Exception
 '''
 AuthError Exception
@@ -61,27 +88,18 @@ def check_permissions(permission, payload):
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        # print(key)
-        if key['kid'] == unverified_header['kid']:
-            # print("kid matched")
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = jwks_cache.get_key(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -91,6 +109,7 @@ def verify_decode_jwt(token):
                 audience=API_AUDIENCE,
                 issuer='https://' + AUTH0_DOMAIN + '/'
             )
+            token_cache.put(token, payload)
             return payload
         except jwt.ExpiredSignatureError:
             raise AuthError({
@@ -0,0 +1,135 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+
+'''
+JWKS fetchers
+Callables returning the parsed JSON Web Key Set. Any zero-argument callable
+can be used in their place, e.g. to serve keys from a test fixture.
+'''
+
+
+def url_fetcher(url, timeout=5):
+    def fetch():
+        with urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    return fetch
+
+
+def file_fetcher(path):
+    def fetch():
+        with open(path) as jwks_file:
+            return json.load(jwks_file)
+    return fetch
+
+
+'''
+JWKSCache
+In-process cache of the signing keys, indexed by their kid.
+
+    ttl
+        seconds after which the keys are considered expired and have to be
+        fetched again before being used
+    refresh_ahead
+        fraction of the ttl after which the keys are refreshed in a
+        background thread, while the current ones are still being served
+    min_refresh_interval
+        minimum number of seconds between two fetch attempts, successful or
+        not, other than the expiry of the keys, so neither forged tokens nor
+        an unreachable JWKS endpoint make every request wait for a fetch
+
+The conditions are checked again once the lock is held, so the requests
+which waited for another one's fetch use its keys instead of fetching them
+again.
+'''
+
+
+class JWKSCache:
+    def __init__(self, fetcher, ttl=600, refresh_ahead=0.8,
+                 min_refresh_interval=30, clock=time.monotonic):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refresh_interval = min_refresh_interval
+        self.clock = clock
+        self._keys = {}
+        # Time of the last successful fetch, and of the last attempt
+        self._fetched_at = None
+        self._attempted_at = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._background = None
+
+    def _age(self):
+        if self._fetched_at is None:
+            return None
+        return self.clock() - self._fetched_at
+
+    def _older_than(self, seconds):
+        age = self._age()
+        return age is None or age >= seconds
+
+    def _can_attempt(self):
+        return self._attempted_at is None or \
+            self.clock() - self._attempted_at >= self.min_refresh_interval
+
+    def refresh(self, needed=None):
+        with self._lock:
+            if needed is not None and not needed():
+                return
+            self._attempted_at = self.clock()
+            try:
+                jwks = self.fetcher()
+            except Exception as e:
+                # Keep serving the keys we have rather than failing every
+                # request while the JWKS endpoint is unreachable.
+                self._error = e
+                if not self._keys:
+                    raise
+                return
+            self._keys = {
+                key['kid']: {
+                    'kty': key['kty'],
+                    'kid': key['kid'],
+                    'use': key['use'],
+                    'n': key['n'],
+                    'e': key['e']
+                } for key in jwks['keys'] if 'kid' in key}
+            self._fetched_at = self.clock()
+            self._error = None
+
+    def _refresh_in_background(self):
+        if self._background is not None and self._background.is_alive():
+            return
+        self._background = threading.Thread(
+            target=self.refresh, daemon=True,
+            args=(lambda: self._older_than(self.ttl * self.refresh_ahead) and
+                  self._can_attempt(),))
+        self._background.start()
+
+    def get_key(self, kid):
+        if self._older_than(self.ttl):
+            self.refresh(lambda: self._older_than(self.ttl) and
+                         self._can_attempt())
+            if not self._keys and self._error is not None:
+                # The fetch failed moments ago, in this or another request
+                raise self._error
+        elif self._older_than(self.ttl * self.refresh_ahead):
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and self._can_attempt():
+            # The keys may have been rotated since the last fetch.
+            self.refresh(lambda: kid not in self._keys and
+                         self._can_attempt())
+            key = self._keys.get(kid)
+        return key
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._attempted_at = None
+            self._error = None
@@ -0,0 +1,74 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+'''
+VerifiedTokenCache
+Bounded LRU cache mapping the digest of an already verified token to its
+decoded payload, so a client reusing the same bearer token only pays for
+the signature check once per token lifetime.
+
+    max_size
+        maximum number of tokens kept, the least recently used is evicted
+    max_age
+        upper bound in seconds on how long a payload is served from the
+        cache, even if its exp claim lies further ahead
+'''
+
+
+class VerifiedTokenCache:
+    def __init__(self, max_size=1024, max_age=300, clock=time.time):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                expires_at, payload = entry
+                if self.clock() < expires_at:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return payload
+                del self._entries[digest]
+            self.misses += 1
+            return None
+
+    def put(self, token, payload):
+        expires_at = self.clock() + self.max_age
+        if 'exp' in payload:
+            expires_at = min(expires_at, payload['exp'])
+
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (expires_at, payload)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -1,14 +1,25 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON, Text, cast
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from fsnd_common.db_pool import engine_options
+from fsnd_common.etag import TableVersions
+
 database_filename = "test.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(
     os.path.join(project_dir, database_filename))
 
 db = SQLAlchemy()
+# Versions of the tables, which the ETags of conditional GETs are made of
+table_versions = TableVersions(db)
+
+# Native JSON column, JSONB on PostgreSQL and JSON text on SQLite. Values are
+# decoded once when the row is loaded and kept on the instance.
+JSONColumn = JSON().with_variant(JSONB(), 'postgresql')
 
 '''
 setup_db(app)
@@ -19,6 +30,7 @@ setup_db(app)
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
 
@@ -49,26 +61,64 @@ class Drink(db.Model):
     title = Column(String(80), unique=True)
     # the ingredients blob - this stores a lazy json blob
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    recipe = Column(JSONColumn, nullable=False)
+    # the recipe without the ingredient names, as listed by short()
+    # kept up to date by set_recipe
+    short_recipe = Column(JSONColumn, nullable=False)
 
     def __init__(self, title, recipe):
         self.title = title
         self.recipe = recipe
 
+    '''
+    set_recipe()
+        normalises the recipe assigned to a drink and computes its short form
+        a JSON string is decoded, a single ingredient becomes a list of one
+        raises KeyError or TypeError if an ingredient misses a field
+    '''
+
+    @validates('recipe')
+    def set_recipe(self, key, recipe):
+        if isinstance(recipe, str):
+            recipe = json.loads(recipe)
+        if isinstance(recipe, dict):
+            recipe = [recipe]
+        self.short_recipe = [{'color': r['color'], 'parts': r['parts']}
+                             for r in recipe]
+        return recipe
+
     '''
     short()
         short form representation of the Drink model
     '''
 
     def short(self):
-        short_recipe = [{'color': r['color'], 'parts': r['parts']}
-                        for r in [json.loads(self.recipe)]]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': self.short_recipe
         }
 
+    '''
+    rows()
+        query of (id, title, recipe as JSON text) ordered by id
+        reads the short recipe, or the full one with detail=True, without
+        loading the models or decoding the recipes
+        EXAMPLE
+            Drink.rows(after=10, limit=20)
+                the 20 drinks following the drink 10
+    '''
+
+    @classmethod
+    def rows(cls, detail=False, after=None, limit=None):
+        recipe = cls.recipe if detail else cls.short_recipe
+        query = db.session.query(cls.id, cls.title,
+                                 cast(recipe, Text).label('recipe'))\
+            .order_by(cls.id)
+        if after is not None:
+            query = query.filter(cls.id > after)
+        return query.limit(limit)
+
     '''
     long()
         long form representation of the Drink model
@@ -78,7 +128,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
     '''
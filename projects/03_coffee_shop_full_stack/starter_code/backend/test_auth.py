@@ -0,0 +1,153 @@
+import json
+import tempfile
+import unittest
+
+from src.auth.jwks import JWKSCache, file_fetcher
+from src.auth.token_cache import VerifiedTokenCache
+
+
+def jwk(kid):
+    return {'kid': kid, 'kty': 'RSA', 'use': 'sig', 'n': 'n-' + kid,
+            'e': 'AQAB'}
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class VerifiedTokenCacheTestCase(unittest.TestCase):
+    """This class represents the verified token cache test case"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = VerifiedTokenCache(max_size=2, max_age=300,
+                                        clock=self.clock)
+
+    def test_payload_is_served_until_max_age(self):
+        self.cache.put('token', {'sub': 'barista'})
+        self.clock.now += 299
+        self.assertEqual(self.cache.get('token'), {'sub': 'barista'})
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get('token'))
+
+    def test_payload_is_not_served_after_its_exp(self):
+        payload = {'sub': 'barista', 'exp': self.clock.now + 60}
+        self.cache.put('token', payload)
+        self.clock.now += 59
+        self.assertEqual(self.cache.get('token'), payload)
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get('token'))
+
+    def test_least_recently_used_token_is_evicted(self):
+        self.cache.put('first', {'sub': 'first'})
+        self.cache.put('second', {'sub': 'second'})
+        self.cache.get('first')
+        self.cache.put('third', {'sub': 'third'})
+        self.assertIsNone(self.cache.get('second'))
+        self.assertEqual(self.cache.get('first'), {'sub': 'first'})
+        self.assertEqual(self.cache.get('third'), {'sub': 'third'})
+
+    def test_stats_count_hits_and_misses(self):
+        self.assertEqual(self.cache.stats()['hit_rate'], 0.0)
+        self.cache.get('token')
+        self.cache.put('token', {'sub': 'barista'})
+        self.cache.get('token')
+        self.cache.get('token')
+        self.clock.now += 300
+        self.cache.get('token')
+        self.assertEqual(self.cache.stats(), {
+            'size': 0,
+            'max_size': 2,
+            'hits': 2,
+            'misses': 2,
+            'hit_rate': 0.5
+        })
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+    """This class represents the signing key cache test case"""
+
+    def setUp(self):
+        self.jwks_file = tempfile.NamedTemporaryFile('w', suffix='.json')
+        self.write_keys('first')
+        self.fetches = 0
+        self.failing = False
+        self.clock = FakeClock()
+        # refresh_ahead=1 keeps the refreshes in the calling thread
+        self.cache = JWKSCache(self.fetch, ttl=600, refresh_ahead=1,
+                               min_refresh_interval=30, clock=self.clock)
+
+    def tearDown(self):
+        self.jwks_file.close()
+
+    def write_keys(self, *kids):
+        self.jwks_file.seek(0)
+        self.jwks_file.truncate()
+        json.dump({'keys': [jwk(kid) for kid in kids]}, self.jwks_file)
+        self.jwks_file.flush()
+
+    def fetch(self):
+        # Counting stub around the local JWKS file
+        self.fetches += 1
+        if self.failing:
+            raise OSError('JWKS endpoint unreachable')
+        return file_fetcher(self.jwks_file.name)()
+
+    def test_keys_are_fetched_once_per_ttl(self):
+        self.assertEqual(self.cache.get_key('first')['n'], 'n-first')
+        self.clock.now += 599
+        self.assertEqual(self.cache.get_key('first')['n'], 'n-first')
+        self.assertEqual(self.fetches, 1)
+        self.clock.now += 1
+        self.cache.get_key('first')
+        self.assertEqual(self.fetches, 2)
+
+    def test_unknown_kid_refetches_once_per_interval(self):
+        self.cache.get_key('first')
+        self.write_keys('first', 'second')
+        self.assertIsNone(self.cache.get_key('second'))
+        self.assertEqual(self.fetches, 1)
+
+        self.clock.now += 30
+        self.assertEqual(self.cache.get_key('second')['n'], 'n-second')
+        self.assertIsNone(self.cache.get_key('forged'))
+        self.assertIsNone(self.cache.get_key('forged'))
+        self.assertEqual(self.fetches, 2)
+        self.clock.now += 30
+        self.assertIsNone(self.cache.get_key('forged'))
+        self.assertEqual(self.fetches, 3)
+
+    def test_keys_are_kept_when_the_fetch_fails(self):
+        self.cache.get_key('first')
+        self.failing = True
+        self.clock.now += 600
+        self.assertEqual(self.cache.get_key('first')['n'], 'n-first')
+        self.assertIsNone(self.cache.get_key('second'))
+        self.assertEqual(self.cache.get_key('first')['n'], 'n-first')
+        # Retried once per interval, not on every request
+        self.assertEqual(self.fetches, 2)
+        self.clock.now += 30
+        self.cache.get_key('first')
+        self.assertEqual(self.fetches, 3)
+
+        self.failing = False
+        self.write_keys('second')
+        self.clock.now += 30
+        self.assertEqual(self.cache.get_key('second')['n'], 'n-second')
+        self.assertIsNone(self.cache.get_key('first'))
+
+    def test_failed_cold_start_raises_without_refetching(self):
+        self.failing = True
+        for _ in range(3):
+            with self.assertRaises(OSError):
+                self.cache.get_key('first')
+        self.assertEqual(self.fetches, 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+'''
+Connection pool settings and health check
+
+engine_options(uri) returns the SQLALCHEMY_ENGINE_OPTIONS for a database,
+read from the environment:
+
+    DB_POOL                  'queue' (default) or 'null' to open a new
+                             connection for every checkout
+    DB_POOL_SIZE             connections kept open per process, 5
+    DB_MAX_OVERFLOW          connections opened on top of those under load
+                             and closed once returned, 10
+    DB_POOL_TIMEOUT          seconds to wait for a free connection, 30
+    DB_POOL_RECYCLE          seconds after which a connection is replaced,
+                             1800, -1 to keep them forever
+    DB_POOL_PRE_PING         test connections on checkout, so that the ones
+                             dropped while idle are replaced, 1 (0 disables)
+    DB_STATEMENT_TIMEOUT_MS  PostgreSQL statement_timeout, unset by default
+
+Under gunicorn every worker has its own pool, so PostgreSQL sees up to
+workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+
+SQLite keeps SQLAlchemy's own pools, only pre-ping applies to it.
+
+add_health_route(app, db) adds GET /health/db, which runs SELECT 1 and
+reports its latency and the state of the pool, or answers 503 when the
+database cannot be reached.
+'''
+import os
+import time
+
+from flask import jsonify
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+
+def engine_options(uri, environ=os.environ):
+    options = {
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', '1') != '0',
+    }
+    if uri.startswith('sqlite'):
+        return options
+
+    if environ.get('DB_POOL', 'queue') == 'null':
+        options['poolclass'] = NullPool
+    else:
+        options.update(
+            pool_size=int(environ.get('DB_POOL_SIZE', 5)),
+            max_overflow=int(environ.get('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=int(environ.get('DB_POOL_TIMEOUT', 30)),
+            pool_recycle=int(environ.get('DB_POOL_RECYCLE', 1800)))
+
+    statement_timeout = environ.get('DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout and uri.startswith('postgres'):
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={int(statement_timeout)}'}
+    return options
+
+
+def pool_status(pool):
+    status = {'pool': type(pool).__name__}
+    # Only QueuePool and its subclasses count their connections
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
+
+
+def add_health_route(app, db):
+    @app.route('/health/db')
+    def database_health():
+        status = pool_status(db.engine.pool)
+        start = time.perf_counter()
+        try:
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception as e:
+            app.logger.error('Database health check failed: %s', e)
+            return jsonify(success=False, error=type(e).__name__,
+                           **status), 503
+        latency = (time.perf_counter() - start) * 1000
+        return jsonify(success=True, latency_ms=round(latency, 2), **status)
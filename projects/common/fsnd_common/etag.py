@@ -0,0 +1,151 @@
+import hashlib
+import random
+from functools import wraps
+
+from flask import g, has_request_context, make_response, request
+from sqlalchemy import Column, Integer, String, Table, event, select
+from sqlalchemy.orm import Session
+
+'''
+Conditional GET
+
+    table_versions = TableVersions(db)
+
+    @app.route('/categories')
+    @table_versions.conditional(Category)
+    def get_categories():
+        ...
+
+gives the response an ETag made of the version of every table it is read
+from and of the requested URL. A request sending that ETag back in
+If-None-Match gets a 304 without running the view, so neither the queries
+nor the serialisation happen, only the lookup of the versions.
+
+The versions are rows of a table_versions table, which db.create_all()
+creates along with the other tables. A table version is bumped in the
+transaction of every commit which wrote to that table through the ORM,
+including query.delete() and query.update(), so every process and worker
+sees it along with the rows. Writes made without the ORM, e.g. from psql,
+have to bump it themselves:
+
+    UPDATE table_versions SET version = version + 1 WHERE name = 'questions';
+
+The versions read by a request are kept for the rest of it, so that e.g. a
+cache of the rows of a table can check that it is up to date with
+
+    table_versions.version('categories')
+
+without querying the versions again after the ETag lookup.
+
+Versions start at a random number when the table is created, so that ETags
+handed out before the database was recreated never match by accident.
+'''
+
+
+def random_version():
+    return random.SystemRandom().randrange(2 ** 30)
+
+
+class TableVersions:
+    def __init__(self, db):
+        self.db = db
+        self.table = Table(
+            'table_versions', db.metadata,
+            Column('name', String(64), primary_key=True),
+            Column('version', Integer, nullable=False))
+        event.listen(self.table, 'after_create', self.seed)
+        event.listen(db.session, 'before_commit', self.bump_changed_tables)
+
+    def seed(self, table, connection, **kwargs):
+        names = [name for name in table.metadata.tables if name != table.name]
+        if names:
+            connection.execute(table.insert(), [
+                {'name': name, 'version': random_version()}
+                for name in names])
+
+    def _read(self):
+        # Versions read by the current request
+        if not has_request_context():
+            return {}
+        return g.setdefault('table_versions', {})
+
+    def get(self, tables):
+        read = self._read()
+        missing = [table for table in tables if table not in read]
+        if missing:
+            versions = dict(self.db.session.execute(
+                select([self.table.c.name, self.table.c.version])
+                .where(self.table.c.name.in_(missing))).fetchall())
+            for table in missing:
+                read[table] = versions.get(table, 0)
+        return [read[table] for table in tables]
+
+    def version(self, table):
+        return self.get([table])[0]
+
+    def bump(self, session, tables):
+        # In name order, so that concurrent commits lock the rows in the
+        # same order
+        for table in sorted(tables):
+            bumped = session.execute(
+                self.table.update()
+                .where(self.table.c.name == table)
+                .values(version=self.table.c.version + 1)).rowcount
+            if not bumped:
+                session.execute(self.table.insert().values(
+                    name=table, version=random_version()))
+
+    def bump_changed_tables(self, session):
+        # Flushed first, so that the tables of the last flush are collected
+        session.flush()
+        tables = session.info.pop('changed_tables', None)
+        if tables:
+            self.bump(session, tables)
+            for table in tables:
+                self._read().pop(table, None)
+
+    def etag(self, tables, key=''):
+        versions = '.'.join(f'{table}:{version}' for table, version
+                            in zip(tables, self.get(tables)))
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return f'{versions}-{digest}'
+
+    def conditional(self, *models):
+        tables = [model.__table__.name for model in models]
+
+        def decorator(view):
+            @wraps(view)
+            def conditional_view(*args, **kwargs):
+                etag = self.etag(tables, request.full_path)
+                if etag in request.if_none_match:
+                    response = make_response('', 304)
+                    response.set_etag(etag)
+                    return response
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    response.set_etag(etag)
+                return response
+            return conditional_view
+        return decorator
+
+
+def changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_changed_tables(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        changed_tables(session).add(instance.__table__.name)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def collect_bulk_changed_table(context):
+    changed_tables(context.session).add(context.mapper.local_table.name)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changed_tables(session):
+    session.info.pop('changed_tables', None)
@@ -0,0 +1,97 @@
+'''
+Per-request SQL statistics
+
+    QueryStats(app)
+
+counts the statements run by every request and the time spent in them, and
+reports both in a Server-Timing header, next to the total time of the
+request, e.g.
+
+    Server-Timing: app;dur=12.4, db;dur=3.1;desc="2 queries"
+
+which the browser developer tools show in the timing of the request.
+Statements slower than SLOW_QUERY_THRESHOLD_MS (100 ms by default, None to
+disable) are logged with the route which ran them to the app logger.
+SERVER_TIMING = False leaves the header out.
+
+Views whose queries run while the response body is streamed, after the
+header was sent, call queries_while_streaming(): their header only has the
+app metric, the time to the first byte, rather than a wrong query count.
+
+The statements are timed by SQLAlchemy engine events, for every engine, and
+only the ones run inside a request are counted.
+'''
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def get_route():
+    rule = request.url_rule
+    return f'{request.method} {rule.rule if rule else request.path}'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context,
+                      executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context,
+                     executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    if not has_request_context() or 'query_count' not in g:
+        return
+    g.query_count += 1
+    g.query_time += elapsed
+
+    threshold = current_app.config['SLOW_QUERY_THRESHOLD_MS']
+    if threshold is not None and elapsed * 1000 >= threshold:
+        current_app.logger.warning(
+            'Slow query (%.1f ms) in %s: %s', elapsed * 1000, get_route(),
+            ' '.join(statement.split()))
+
+
+@event.listens_for(Engine, 'handle_error')
+def discard_query_timer(context):
+    # after_cursor_execute is not called for failed statements
+    timers = context.connection.info.get('query_start_time')
+    if timers:
+        timers.pop()
+
+
+def queries_while_streaming():
+    g.queries_while_streaming = True
+
+
+class QueryStats:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 100)
+        app.config.setdefault('SERVER_TIMING', True)
+        app.before_request(self.start_request)
+        app.after_request(self.add_server_timing)
+
+    def start_request(self):
+        g.request_start_time = time.perf_counter()
+        g.query_count = 0
+        g.query_time = 0.0
+
+    def add_server_timing(self, response):
+        if not current_app.config['SERVER_TIMING'] or \
+                'request_start_time' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start_time
+        timing = f'app;dur={elapsed * 1000:.1f}'
+        if not g.get('queries_while_streaming'):
+            queries = 'query' if g.query_count == 1 else 'queries'
+            timing += f', db;dur={g.query_time * 1000:.1f};' \
+                f'desc="{g.query_count} {queries}"'
+        response.headers.add('Server-Timing', timing)
+        return response
@@ -0,0 +1,9 @@
+from setuptools import setup
+
+setup(
+    name='fsnd-common',
+    version='0.1.0',
+    description='Database and request helpers shared by the FSND projects',
+    packages=['fsnd_common'],
+    install_requires=['Flask', 'SQLAlchemy'],
+)